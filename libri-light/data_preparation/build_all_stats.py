@@ -1,9 +1,11 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 import argparse
 from pathlib import Path
+import data_cache
 import metadata_completion.utilities as ut
 import plot
 
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Build the statistics on LibriBig")
@@ -22,23 +24,22 @@ if __name__ == "__main__":
     path_cache = args.out_dir / ".cache"
     Path.mkdir(path_cache, exist_ok=True)
 
-    # Get the list of all metadata
+    # Get the list of all metadata: a json per audio file, or a .jsonl per
+    # book
     print("Gathering the list of metadata")
-    path_cache_metadata = path_cache / "metadata.pkl"
-    list_metadata = ut.load_cache(path_cache_metadata,
-                                  ut.get_all_metadata,
-                                  args=(args.path_data, ".json"),
-                                  ignore_cache=args.ignore_cache)
+    list_metadata = data_cache.cached(path_cache, ut.get_all_metadata,
+                                      args=(args.path_data,
+                                            ('.json', '.jsonl')),
+                                      inputs=(args.path_data,),
+                                      input_pattern='*.json*',
+                                      ignore_cache=args.ignore_cache)
     print(f"{len(list_metadata)} files found")
 
-    # Get the genre statistics
+    # The durations are read from the audio headers, in a single scan
+    # shared by all the statistics and cached with the metadata list
     print("Building the genre statistics")
-    path_genre_stats = path_cache / "meta_genre_stats.json"
-    genre_data = ut.load_cache(path_genre_stats,
-                               ut.get_hour_tag_repartition,
-                               args=(list_metadata,
-                                     "meta_genre", ".flac"),
-                               ignore_cache=args.ignore_cache)
+    genre_data = ut.get_hour_tag_repartition(list_metadata, "meta_genre",
+                                             ".flac", dir_cache=path_cache)
 
     path_tags_hist = args.out_dir / "meta_genres.png"
     plot.plot_pie(genre_data, str(path_tags_hist),
@@ -48,11 +49,8 @@ if __name__ == "__main__":
 
     # Get the speaker statistics
     print("Building the speaker statistics")
-    path_speaker_cache = path_cache / "speaker_stats.json"
-    speaker_data = ut.load_cache(path_speaker_cache,
-                                 ut.get_speaker_hours_data,
-                                 args=(list_metadata,
-                                       ".flac"))
+    speaker_data = ut.get_speaker_hours_data(list_metadata, ".flac",
+                                             dir_cache=path_cache)
 
     speaker_hours = [x for _, x in speaker_data.items()]
     path_speaker_hist = args.out_dir / "speaker_data.png"
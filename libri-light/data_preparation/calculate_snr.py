@@ -2,6 +2,7 @@
 import sys
 import time
 import os
+import sqlite3
 import numpy as np
 from scipy.io import wavfile
 import multiprocessing
@@ -90,41 +91,109 @@ def cal_snr_librivox(file_name):
     return calculate_file_snr(file_name, speech_th=0.8, noise_th=0.995)
 
 
-def mp_file_snr(lst_file, records=None, nproc=60):
+class SNRStore:
+    """
+    SQLite table of SNR results, keyed by the audio path. Each row also keeps
+    the modification time of the audio / vad pair it was computed from, so
+    that files which changed since the last run are recomputed.
+    """
+
+    def __init__(self, path_db, flush_every=1000, flush_interval_s=30.):
+        self.connection = sqlite3.connect(path_db)
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS snr (
+                                   path TEXT PRIMARY KEY,
+                                   mtime REAL NOT NULL,
+                                   snr REAL,
+                                   speech_power REAL,
+                                   noise_power REAL)""")
+        self.connection.commit()
+        self.flush_every = flush_every
+        self.flush_interval_s = flush_interval_s
+        self.n_pending = 0
+        self.last_flush = time.time()
+
+    def is_up_to_date(self, file_name, mtime):
+        row = self.connection.execute("SELECT mtime FROM snr WHERE path = ?",
+                                      (file_name,)).fetchone()
+        return row is not None and row[0] >= mtime
+
+    def put(self, file_name, mtime, snr_fields):
+        # sqlite3 would store numpy scalars as blobs
+        self.connection.execute("INSERT OR REPLACE INTO snr VALUES (?, ?, ?, ?, ?)",
+                                [file_name, float(mtime)]
+                                + [float(x) for x in snr_fields])
+        self.n_pending += 1
+        if self.n_pending >= self.flush_every \
+                or time.time() - self.last_flush > self.flush_interval_s:
+            self.flush()
+
+    def flush(self):
+        self.connection.commit()
+        self.n_pending = 0
+        self.last_flush = time.time()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def get_input_mtime(file_name):
+    r"""
+    Latest modification time of an audio file and of its .vad file.
+    """
+    vad_file = file_name[:-4] + '.vad'
+    mtime = os.path.getmtime(file_name)
+    if os.path.exists(vad_file):
+        mtime = max(mtime, os.path.getmtime(vad_file))
+    return mtime
+
+
+def mp_file_snr(lst_file, path_db, nproc=60):
     with open(lst_file, 'r') as fh:
         fnames = [line.split()[0] for line in fh]
-    if records is not None:
-        with open(records, 'r') as fh:
-            existing_fname = [line.split()[0] for line in fh]
-        fnames = set(fnames) - set(existing_fname)
-    print("loaded {} file to process".format(len(fnames)), file=sys.stderr)
-    pool = multiprocessing.Pool(nproc)
+    store = SNRStore(path_db)
+    fname2mtime = {}
+    for fname in fnames:
+        mtime = get_input_mtime(fname)
+        if not store.is_up_to_date(fname, mtime):
+            fname2mtime[fname] = mtime
+    print("loaded {} file to process, {} already up to date".format(
+        len(fname2mtime), len(fnames) - len(fname2mtime)), file=sys.stderr)
     print("processing librivox format", file=sys.stderr)
-    it = pool.imap_unordered(cal_snr_librivox, fnames)
-    st = time.time()
-    cnt = 0
-    for fname, snr_fields in it:
-        cnt += 1
-        if snr_fields is not None:
-            sys.stdout.write('{}\t{}\t{}\t{}\n'.format(
-                *([fname] + snr_fields)))
-        if cnt % 1000 == 0 and cnt != 0:
-            dur = time.time() - st
-            print("{} file/s".format(cnt / dur), file=sys.stderr)
+    # The results received before an error are kept
+    try:
+        with multiprocessing.Pool(nproc) as pool:
+            it = pool.imap_unordered(cal_snr_librivox, list(fname2mtime))
             st = time.time()
             cnt = 0
+            for fname, snr_fields in it:
+                cnt += 1
+                if snr_fields is not None:
+                    store.put(fname, fname2mtime[fname], snr_fields)
+                if cnt % 1000 == 0 and cnt != 0:
+                    dur = time.time() - st
+                    print("{} file/s".format(cnt / dur), file=sys.stderr)
+                    st = time.time()
+                    cnt = 0
+            pool.close()
+            pool.join()
+    finally:
+        store.close()
 
 
 if __name__ == "__main__":
     usage = """
-    example: python calculate_snr.py librivox.lst > snr_output.tsv
+    example: python calculate_snr.py librivox.lst snr_output.db
     """
     parser = argparse.ArgumentParser(description=usage)
     parser.add_argument("wav_list", type=str,
                         help="list path to wavs. oneline per file")
-    parser.add_argument("--resume_from", type=str,
-                        help="if specified, all entries in the resume-from file will be skipped")
+    parser.add_argument("path_db", type=str,
+                        help="sqlite file where the results are stored. "
+                        "If it already exists, files which are up to date "
+                        "in it will be skipped")
     parser.add_argument("--numproc", type=int, default=40,
                         help="num of processes")
     args = parser.parse_args()
-    mp_file_snr(args.wav_list, records=args.resume_from, nproc=args.numproc)
+    mp_file_snr(args.wav_list, args.path_db, nproc=args.numproc)
@@ -0,0 +1,45 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import math
+import os
+import tempfile
+import unittest
+import numpy as np
+from calculate_snr import SNRStore
+from split_librilight.puts_json import read_snr
+
+
+class TestSNRStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path_db = os.path.join(self.tmp_dir.name, 'snr.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_numpy_values(self):
+        store = SNRStore(self.path_db)
+        store.put('/data/book_a/1.flac', 10.5,
+                  [np.float32(12.5), np.float32(0.25), np.float32(0.0125)])
+        store.put('/data/book_a/2.flac', 10.5,
+                  [float('nan'), np.float64(0.5), float('nan')])
+        store.close()
+
+        snr_table = read_snr(self.path_db)
+        snr = snr_table['book_a']['1']
+        self.assertIsInstance(snr, float)
+        self.assertEqual(snr, 12.5)
+        self.assertTrue(math.isnan(snr_table['book_a']['2']))
+
+        store = SNRStore(self.path_db)
+        self.assertTrue(store.is_up_to_date('/data/book_a/1.flac', 10.5))
+        self.assertFalse(store.is_up_to_date('/data/book_a/1.flac', 11))
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@ from pathlib import Path
 import sys
 import json
 
+import data_cache
+import fetch
 import metadata_completion.utilities as ut
 from metadata_completion.GenreScrapper import gather_all_genres
 from metadata_completion.ReaderScapper import update_all_speaker_data
@@ -21,6 +23,8 @@ def parse_args():
                         default="/checkpoint/mriviere/LibriVox")
     parser.add_argument('--ignore_cache', action='store_true')
     parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--n_workers', type=int, default=8,
+                        help="Number of web pages fetched concurrently")
     parser_out = parser.add_mutually_exclusive_group(required=False)
     parser_out.add_argument('--out_dir', type=str, default=None,
                             help="Path to the output directory")
@@ -45,17 +49,23 @@ def main(argv):
 
     path_cache = path_out / ".cache"
     Path.mkdir(path_cache, exist_ok=True)
+    # Web pages already fetched by a previous run are read from the cache
+    fetch.configure(cache_dir=path_cache / "http", n_workers=args.n_workers)
 
     path_global_data_dir = path_out / "global"
     Path.mkdir(path_global_data_dir, exist_ok=True)
 
     # Get the list of all metadata
     print("Gathering the list of metadata")
-    path_cache_metadata = path_cache / "metadata.pkl"
-    list_metadata = ut.load_cache(path_cache_metadata,
-                                  ut.get_all_metadata,
-                                  args=(args.path_metadata,),
-                                  ignore_cache=args.ignore_cache)
+    # Only the metadata files are part of the fingerprint: the other outputs
+    # written in path_metadata with --in_place (global/, texts...) don't
+    # invalidate the cache, and the metadata files are only rewritten when
+    # their tags change
+    list_metadata = data_cache.cached(path_cache, ut.get_all_metadata,
+                                      args=(args.path_metadata,),
+                                      inputs=(args.path_metadata,),
+                                      input_pattern='*_metadata.json',
+                                      ignore_cache=args.ignore_cache)
 
     if args.debug:
         list_metadata = list_metadata[:10]
@@ -64,7 +74,9 @@ def main(argv):
     genre_list = gather_all_genres(args.path_metadata,
                                    list_metadata)
 
-    ut.get_updated_metadata(genre_list, args.path_metadata, path_out, "genre")
+    # All the tag updates are gathered and written in a single pass at the end
+    metadata_update = ut.MetadataUpdate()
+    metadata_update.add(genre_list, "genre")
 
     # Fold the genres
     reverse_folding_unique = ut.build_reverse_folding(UNIQUE_GENRE_FOLDING)
@@ -75,8 +87,7 @@ def main(argv):
     # Convert the "dramatic reading" option into a binary tag
     has_dramatic_reading = [(name, 'Dramatic Readings' in vals)
                             for name, vals in genre_list]
-    ut.get_updated_metadata(has_dramatic_reading, path_out,
-                            path_out, 'Dramatic Readings')
+    metadata_update.add(has_dramatic_reading, 'Dramatic Readings')
     genre_list = [(name, ut.remove_tag(vals, 'Dramatic Readings', 'Undefined'))
                   for name, vals in genre_list]
 
@@ -86,8 +97,7 @@ def main(argv):
                                                     SUPER_GENDER_ORDERING))
                      for name, vals in genre_list]
 
-    ut.get_updated_metadata(folded_genres, path_out,
-                            path_out, "meta_genre")
+    metadata_update.add(folded_genres, "meta_genre")
 
     # Retrieve the readers names
     update_all_speaker_data(list_metadata, args.path_metadata, path_out)
@@ -102,8 +112,9 @@ def main(argv):
     # Clean text data when possible
     text_status = clean_all_text_data(list_metadata, args.path_metadata,
                                       str(path_out))
-    ut.get_updated_metadata(text_status, path_out,
-                            path_out, "trancription_status")
+    metadata_update.add(text_status, "trancription_status")
+
+    metadata_update.apply(args.path_metadata, path_out)
 
 
 if __name__ == "__main__":
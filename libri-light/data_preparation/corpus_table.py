@@ -0,0 +1,212 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
+import argparse
+import dataclasses
+import json
+import multiprocessing
+import os
+import numpy as np
+import data_cache
+
+
+def get_file_genres(book_meta):
+    if 'genre' not in book_meta or book_meta['genre'] is None:
+        return ['<none>']
+    return book_meta['genre']
+
+
+def get_file_tag(book_meta, tag_name):
+    value = book_meta.get(tag_name)
+    if value is None:
+        value = 'null'
+    if isinstance(value, list):
+        value = '+'.join(value)
+    return value
+
+
+def read_records(path):
+    r"""
+    Returns the [(json path, meta-data)] stored in path, which is either the
+    json of a single audio file or the .jsonl file of a whole book written
+    by puts_json.py --jsonl. In the latter case, the json paths are the ones
+    the per-file jsons would have.
+    """
+    if path.endswith('.jsonl'):
+        dir_name = os.path.dirname(path)
+        out = []
+        with open(path, 'r') as file:
+            for line in file:
+                data = json.loads(line)
+                out.append((os.path.join(dir_name, data.pop('file') + '.json'),
+                            data))
+        return out
+    with open(path, 'r') as file:
+        return [(path, json.load(file))]
+
+
+def _read_row(path):
+    r"""
+    Keeps only the columns of the table, to limit what goes through the pipe
+    between the worker processes and the main one.
+    """
+    out = []
+    for fname, data in read_records(path):
+        book_meta = data['book_meta']
+        speaker = data['speaker'] if data['speaker'] is not None else 'null'
+        out.append((fname, str(speaker), str(book_meta['id']),
+                    get_file_genres(book_meta),
+                    get_file_tag(book_meta, 'meta_genre'),
+                    data['snr'], data['file_length_sec'],
+                    len(data['voice_activity'])))
+    return out
+
+
+def _factorize(values):
+    vocabulary, codes = np.unique(np.array(values, dtype=str),
+                                  return_inverse=True)
+    return vocabulary, codes.astype(np.int32)
+
+
+@dataclasses.dataclass
+class CorpusTable:
+    r"""
+    Columnar view of the per-file meta-data of the corpus. String columns
+    are dictionary-encoded: `speaker[i]` indexes `speakers`, etc. The genres
+    of file i are `genres[genre_codes[genre_offsets[i]:genre_offsets[i+1]]]`.
+    The file names are packed in a single utf-8 blob.
+    """
+    fname_blob: np.ndarray
+    fname_offsets: np.ndarray
+    speakers: np.ndarray
+    speaker: np.ndarray
+    books: np.ndarray
+    book: np.ndarray
+    meta_genres: np.ndarray
+    meta_genre: np.ndarray
+    genres: np.ndarray
+    genre_offsets: np.ndarray
+    genre_codes: np.ndarray
+    snr: np.ndarray
+    file_length_sec: np.ndarray
+    n_vad: np.ndarray
+
+    def __len__(self):
+        return self.snr.shape[0]
+
+    def fname(self, index):
+        start, end = self.fname_offsets[index], self.fname_offsets[index + 1]
+        return self.fname_blob[start:end].tobytes().decode('utf-8')
+
+    def fnames(self, indices=None):
+        if indices is None:
+            indices = range(len(self))
+        return [self.fname(i) for i in indices]
+
+    def genre_incidence(self):
+        r"""
+        Boolean matrix of size n_files x n_genres.
+        """
+        out = np.zeros((len(self), len(self.genres)), dtype=bool)
+        rows = np.repeat(np.arange(len(self)), np.diff(self.genre_offsets))
+        out[rows, self.genre_codes] = True
+        return out
+
+    def save(self, path_out):
+        tmp_path = str(path_out) + '.tmp.npz'
+        np.savez(tmp_path, **dataclasses.asdict(self))
+        os.replace(tmp_path, path_out)
+
+    @staticmethod
+    def load(path_in):
+        with np.load(path_in) as data:
+            return CorpusTable(**{field.name: data[field.name]
+                                  for field in dataclasses.fields(CorpusTable)})
+
+
+TABLE_SERIALIZER = data_cache.Serializer('.npz', CorpusTable.save,
+                                         CorpusTable.load)
+
+
+def list_metadata_files(path_dir):
+    out = []
+    for root, dirs, filenames in os.walk(path_dir):
+        for f in filenames:
+            if f.endswith('.json') or f.endswith('.jsonl'):
+                out.append(os.path.join(root, f))
+    out.sort()
+    return out
+
+
+def compile_table(list_files, n_workers=16):
+    r"""
+    Reads the per-file meta-data jsons (or per-book jsonl files) of
+    list_files in parallel and builds their CorpusTable.
+    """
+    with multiprocessing.Pool(processes=n_workers) as pool:
+        rows = [row for rows in pool.imap(_read_row, list_files, chunksize=64)
+                for row in rows]
+
+    fnames = [row[0].encode('utf-8') for row in rows]
+    fname_offsets = np.zeros(len(fnames) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in fnames], out=fname_offsets[1:])
+
+    speakers, speaker = _factorize([row[1] for row in rows])
+    books, book = _factorize([row[2] for row in rows])
+    meta_genres, meta_genre = _factorize([row[4] for row in rows])
+    genre_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row[3]) for row in rows], out=genre_offsets[1:])
+    genres, genre_codes = _factorize([g for row in rows for g in row[3]])
+
+    return CorpusTable(
+        fname_blob=np.frombuffer(b''.join(fnames), dtype=np.uint8),
+        fname_offsets=fname_offsets,
+        speakers=speakers, speaker=speaker,
+        books=books, book=book,
+        meta_genres=meta_genres, meta_genre=meta_genre,
+        genres=genres, genre_offsets=genre_offsets, genre_codes=genre_codes,
+        snr=np.array([row[5] for row in rows], dtype=np.float64),
+        file_length_sec=np.array([row[6] for row in rows], dtype=np.float64),
+        n_vad=np.array([row[7] for row in rows], dtype=np.int32))
+
+
+def compile_dir(path_dir, n_workers=16):
+    print(f"Compiling the corpus table of {path_dir}")
+    return compile_table(list_metadata_files(path_dir), n_workers=n_workers)
+
+
+def cached_compile_dir(dir_cache, path_dir, n_workers=16,
+                       ignore_cache=False):
+    r"""
+    compile_dir(path_dir), cached in dir_cache. The table is compiled again
+    as soon as a metadata file of path_dir changes: the audio files are not
+    part of the fingerprint, so that a cache hit doesn't stat all of them.
+    """
+    return data_cache.cached(dir_cache, compile_dir, args=(path_dir,),
+                             inputs=(path_dir,), input_pattern='*.json*',
+                             serializer=TABLE_SERIALIZER,
+                             ignore_cache=ignore_cache,
+                             kwargs={'n_workers': n_workers})
+
+
+def group_sum(codes, values, vocabulary):
+    r"""
+    Sums values per dictionary code, as a {label: sum} dict.
+    """
+    counts = np.bincount(codes, minlength=len(vocabulary))
+    sums = np.bincount(codes, weights=values, minlength=len(vocabulary))
+    return {str(vocabulary[i]): float(sums[i]) for i in np.flatnonzero(counts)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compiles the per-file meta-data jsons of a directory "
+        "into a single columnar table")
+    parser.add_argument('path_dir', type=str,
+                        help="Directory containing the meta-data files")
+    parser.add_argument('path_out', type=str,
+                        help="Output .npz file")
+    parser.add_argument('--n_workers', type=int, default=16)
+    args = parser.parse_args()
+
+    table = compile_dir(args.path_dir, n_workers=args.n_workers)
+    table.save(args.path_out)
+    print(f"{len(table)} files saved at {args.path_out}")
@@ -0,0 +1,144 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
+import fnmatch
+import hashlib
+import os
+import pickle
+import time
+from collections import namedtuple
+from pathlib import Path
+import numpy as np
+
+
+# Bump to invalidate all the existing caches
+CACHE_VERSION = 1
+
+
+Serializer = namedtuple('Serializer', ['extension', 'dump', 'load'])
+
+
+def _dump_pickle(data, path):
+    with open(path, 'wb') as file:
+        pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_pickle(path):
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+def _dump_arrays(data, path):
+    np.savez(path, **data)
+
+
+def _load_arrays(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+# Any picklable object
+PICKLE = Serializer('.pkl', _dump_pickle, _load_pickle)
+# A {name: numpy array} dict, for large tables
+ARRAYS = Serializer('.npz', _dump_arrays, _load_arrays)
+
+
+def _hash_tree(path, hasher, pattern=None):
+    r"""
+    Feeds hasher with the path, size and mtime of all the files and
+    directories under path. Adding, removing, renaming or modifying a file
+    changes the hash. Hidden entries, such as the cache directory itself,
+    are ignored.
+
+    If pattern is given, only the files whose name matches it are hashed:
+    the directories are walked but don't change the hash themselves.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        hasher.update(f'{path}:missing\n'.encode('utf-8'))
+        return
+    is_dir = os.path.isdir(path)
+    if pattern is None or not is_dir:
+        hasher.update(f'{path}:{stat.st_size}:{stat.st_mtime_ns}\n'
+                      .encode('utf-8'))
+    if not is_dir:
+        return
+    with os.scandir(path) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.name.startswith('.'):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            _hash_tree(entry.path, hasher, pattern)
+        elif pattern is not None and not fnmatch.fnmatch(entry.name, pattern):
+            continue
+        else:
+            stat = entry.stat()
+            hasher.update(f'{entry.path}:{stat.st_size}:{stat.st_mtime_ns}\n'
+                          .encode('utf-8'))
+
+
+def fingerprint(name, args=(), inputs=(), input_pattern=None):
+    r"""
+    Hash of the cache version, name, args and of the state of the input
+    files / directories.
+    """
+    hasher = hashlib.sha1()
+    hasher.update(f'{CACHE_VERSION}\n{name}\n{args!r}\n{input_pattern}\n'
+                  .encode('utf-8'))
+    for path in inputs:
+        _hash_tree(str(path), hasher, input_pattern)
+    return hasher.hexdigest()
+
+
+def cached(dir_cache, function, args=(), inputs=(), serializer=PICKLE,
+           ignore_cache=False, kwargs=None, input_pattern=None):
+    r"""
+    Returns function(*args, **kwargs), from dir_cache if it was already
+    computed with the same args and the same input files.
+
+    The cache entry is named after function and the fingerprint of args and
+    inputs: a modification of the inputs always leads to a new computation.
+    kwargs are not part of the fingerprint, they are meant for options that
+    don't change the output (number of workers...). Older entries of
+    function are removed when a new one is saved.
+
+    input_pattern (e.g. '*.json') restricts the fingerprint to the matching
+    files of inputs, so that other files written there, like the outputs of
+    the script, don't invalidate the cache.
+    """
+    name = function.__name__
+    start_time = time.time()
+    key = fingerprint(f'{function.__module__}.{name}', args, inputs,
+                      input_pattern)
+    path_cache = Path(dir_cache) / f'{name}-{key[:16]}{serializer.extension}'
+    fingerprint_time = time.time() - start_time
+
+    if path_cache.is_file() and not ignore_cache:
+        start_time = time.time()
+        try:
+            out = serializer.load(str(path_cache))
+            print(f"Cache hit for {name} at {path_cache}: "
+                  f"{fingerprint_time:.2f}s fingerprint, "
+                  f"{time.time() - start_time:.2f}s load")
+            return out
+        except Exception as error:
+            print(f"Invalid cache at {path_cache}: {error}")
+
+    start_time = time.time()
+    out = function(*args, **(kwargs or {}))
+    compute_time = time.time() - start_time
+
+    start_time = time.time()
+    Path(dir_cache).mkdir(parents=True, exist_ok=True)
+    # The temporary file keeps the extension: np.savez would add one
+    tmp_path = path_cache.with_name(f'.{path_cache.stem}.tmp'
+                                    f'{serializer.extension}')
+    serializer.dump(out, str(tmp_path))
+    os.replace(tmp_path, path_cache)
+    for path in Path(dir_cache).glob(f'{name}-*{serializer.extension}'):
+        if path != path_cache:
+            path.unlink()
+    print(f"Cache miss for {name}: {fingerprint_time:.2f}s fingerprint, "
+          f"{compute_time:.2f}s computation, "
+          f"{time.time() - start_time:.2f}s save at {path_cache}")
+    return out
@@ -0,0 +1,100 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import data_cache
+
+
+CALLS = []
+
+
+def list_dir(path_dir):
+    CALLS.append(path_dir)
+    return sorted(os.listdir(path_dir))
+
+
+def make_table(n):
+    CALLS.append(n)
+    return {'x': np.arange(n), 'y': np.ones(n)}
+
+
+class TestCached(unittest.TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir_cache = os.path.join(self.tmp_dir.name, '.cache')
+        self.dir_in = os.path.join(self.tmp_dir.name, 'data')
+        os.makedirs(os.path.join(self.dir_in, 'sub'))
+        self.write('a.json', '1')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.dir_in, 'sub', name), 'w') as file:
+            file.write(content)
+
+    def cached_list(self):
+        return data_cache.cached(self.dir_cache, list_dir,
+                                 args=(self.dir_in + '/sub',),
+                                 inputs=(self.dir_in,))
+
+    def test_hit(self):
+        self.assertEqual(self.cached_list(), ['a.json'])
+        self.assertEqual(self.cached_list(), ['a.json'])
+        self.assertEqual(len(CALLS), 1)
+        self.assertEqual(len(os.listdir(self.dir_cache)), 1)
+
+    def test_input_change(self):
+        self.cached_list()
+        self.write('b.json', '2')
+        self.assertEqual(self.cached_list(), ['a.json', 'b.json'])
+
+        # Same names, different content
+        os.utime(os.path.join(self.dir_in, 'sub', 'a.json'), ns=(0, 0))
+        self.cached_list()
+        self.assertEqual(len(CALLS), 3)
+        # Only the last entry is kept
+        self.assertEqual(len(os.listdir(self.dir_cache)), 1)
+
+    def test_input_pattern(self):
+        def cached_list():
+            return data_cache.cached(self.dir_cache, list_dir,
+                                     args=(self.dir_in + '/sub',),
+                                     inputs=(self.dir_in,),
+                                     input_pattern='*.json')
+        cached_list()
+        # Other files and directories don't change the fingerprint
+        self.write('out.txt', 'x')
+        os.makedirs(os.path.join(self.dir_in, 'global'))
+        self.assertEqual(cached_list(), ['a.json'])
+        self.assertEqual(len(CALLS), 1)
+
+        self.write('b.json', '2')
+        self.assertEqual(cached_list(), ['a.json', 'b.json', 'out.txt'])
+        self.assertEqual(len(CALLS), 2)
+
+    def test_args_and_ignore(self):
+        data_cache.cached(self.dir_cache, make_table, args=(3,),
+                          serializer=data_cache.ARRAYS)
+        out = data_cache.cached(self.dir_cache, make_table, args=(4,),
+                                serializer=data_cache.ARRAYS)
+        np.testing.assert_array_equal(out['x'], np.arange(4))
+        out = data_cache.cached(self.dir_cache, make_table, args=(4,),
+                                serializer=data_cache.ARRAYS)
+        np.testing.assert_array_equal(out['y'], np.ones(4))
+        self.assertEqual(CALLS, [3, 4])
+
+        data_cache.cached(self.dir_cache, make_table, args=(4,),
+                          serializer=data_cache.ARRAYS, ignore_cache=True)
+        self.assertEqual(CALLS, [3, 4, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
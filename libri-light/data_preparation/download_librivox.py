@@ -1,34 +1,18 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
-import requests
-import urllib.request
 from html.parser import HTMLParser
 import os
 import sys
+import time
 from termcolor import colored
 import json
-import progressbar
 
 
 import argparse
+import fetch
+from downloader import DownloadManager
 from text_retrieval import get_text_data
 
 
-class RequestPBar():
-    def __init__(self):
-        self.pbar = None
-
-    def __call__(self, block_num, block_size, total_size):
-        if not self.pbar:
-            self.pbar = progressbar.ProgressBar(maxval=total_size)
-            self.pbar.start()
-
-        downloaded = block_num * block_size
-        if downloaded < total_size:
-            self.pbar.update(downloaded)
-        else:
-            self.pbar.finish()
-
-
 class MyHTMLParser(HTMLParser):
 
     def __init__(self):
@@ -110,15 +94,35 @@ class MyHTMLParser(HTMLParser):
 
 def get_reader_data(url):
     parser = MyHTMLParser()
-    req = requests.get(url)
-    parser.feed(str(req._content))
+    parser.feed(str(fetch.get(url)))
     return parser.chapterNames, parser.chapterReaders
 
 
-def import_page(baseUrl, offset, limit, dirOut, language):
+def get_book_web_data(bookData):
+    r"""
+    Fetches the speaker and text data of a book. Returns
+    (chaptersNames, chapterReaders, txtData), with None for what couldn't
+    be retrieved.
+    """
+    title = bookData['title']
+    chapterReaders, chaptersNames, txtData = None, None, None
+    try:
+        chaptersNames, chapterReaders = \
+            get_reader_data(bookData['url_librivox'])
+    except Exception:
+        print(colored(f'Error when loading title {title} metadata', 'red'))
+        print(colored(sys.exc_info(), 'red'))
+    try:
+        txtData = get_text_data(bookData['url_text_source'])
+    except Exception:
+        print(colored(f'Error when loading {title}\'s text data', 'red'))
+    return chaptersNames, chapterReaders, txtData
+
+
+def import_page(baseUrl, offset, limit, dirOut, language, manager=None):
 
     urlRequest = f'{baseUrl}/?offset={offset}&format=json&limit={limit}'
-    response = requests.get(urlRequest).json()
+    response = fetch.get_json(urlRequest)
 
     if "error" in response:
         return -1
@@ -132,19 +136,20 @@ def import_page(baseUrl, offset, limit, dirOut, language):
     if len(bookList) == 0:
         return -1
 
-    for bookData in bookList:
-        if bookData['language'] != language:
-            continue
+    if manager is None:
+        manager = DownloadManager(dirOut)
+
+    bookList = [bookData for bookData in bookList
+                if bookData['language'] == language]
+    # The web pages of all the books of the page are fetched concurrently
+    allWebData = fetch.thread_map(get_book_web_data, bookList)
+
+    downloads = []
+    for bookData, webData in zip(bookList, allWebData):
+        chaptersNames, chapterReaders, txtData = webData
 
         title = bookData['title']
         print(f'Loading title {title}...')
-        chapterReaders, chaptersNames = None, None
-        try:
-            chaptersNames, chapterReaders = \
-                get_reader_data(bookData['url_librivox'])
-        except:
-            print(colored(f'Error when loading title {title} metadata', 'red'))
-            print(colored(sys.exc_info(), 'red'))
 
         name = os.path.splitext(os.path.basename(bookData['url_zip_file']))[0]
 
@@ -160,41 +165,42 @@ def import_page(baseUrl, offset, limit, dirOut, language):
         with open(outMetadata, 'w') as file:
             json.dump(bookData, file, indent=2)
         print(f'{title}\'s metadata loaded')
-        try:
-            txtData = get_text_data(bookData['url_text_source'])
+        if txtData is not None:
             outTxt = os.path.join(dirOut, f'{name}_text.txt')
             with open(outTxt, 'w') as file:
                 file.write(txtData)
                 print('... text data loaded')
             fullSize += os.path.getsize(outTxt)
-        except:
-            print(colored(f'Error when loading {title}\'s text data', 'red'))
-
-        print(f'Loading audio data at {bookData["url_zip_file"]}')
-        outPath = os.path.join(dirOut, name + ".zip")
-        if not os.path.isfile(outPath):
-            try:
-                d = urllib.request.urlopen(bookData['url_zip_file'])
-                fullSize += int(d.info()['Content-Length'])
-                urllib.request.urlretrieve(bookData['url_zip_file'], outPath,
-                                           RequestPBar())
-            except KeyboardInterrupt:
-                if os.path.isfile(outPath):
-                    os.remove(outPath)
-                sys.exit()
-            except:
-                if os.path.isfile(outPath):
-                    os.remove(outPath)
+
+        # Zips downloaded before the manifest existed are complete: failed
+        # downloads used to be deleted
+        if not os.path.isfile(os.path.join(dirOut, name + ".zip")):
+            downloads.append((bookData['url_zip_file'], name + ".zip",
+                              None, None))
 
         print('')
 
-    return fullSize
+    print(f'Loading {len(downloads)} audio files, '
+          f'{manager.n_workers} at a time')
+    startTime = time.time()
+    nBytes = 0
+    for name, size, error in manager.download_all(downloads):
+        if error is not None:
+            print(colored(f'Error when loading {name}: {error}', 'red'))
+            continue
+        nBytes += size
+        print(f'{name} loaded')
+    elapsed = time.time() - startTime
+    print(f'{nBytes / 2**20:.1f} MB loaded in {elapsed:.1f}s '
+          f'({nBytes / 2**20 / max(elapsed, 1e-6):.1f} MB/s)')
 
+    return fullSize + nBytes
 
-def get_size_page(baseUrl, offset, limit, language):
+
+def get_size_page(baseUrl, offset, limit, language, manager):
 
     urlRequest = f'{baseUrl}/?offset={offset}&format=json&limit={limit}'
-    response = requests.get(urlRequest).json()
+    response = fetch.get_json(urlRequest)
 
     if "error" in response:
         return -1
@@ -209,23 +215,24 @@ def get_size_page(baseUrl, offset, limit, language):
     if len(bookList) == 0:
         return -1
 
-    for bookData in bookList:
-        if bookData['language'] != language:
-            continue
-        title = bookData['title']
-        print(f'Loading title {title}...')
+    bookList = [bookData for bookData in bookList
+                if bookData['language'] == language]
 
+    def headSize(url):
         try:
-            d = urllib.request.urlopen(bookData['url_zip_file'])
-            size = int(d.info()['Content-Length'])
-            outSize += size
-        except KeyboardInterrupt:
-            sys.exit()
-        except:
+            return manager.head_size(url)
+        except Exception:
+            return None
+
+    # HEAD requests only: nothing is downloaded
+    sizes = fetch.thread_map(headSize, [bookData['url_zip_file']
+                                        for bookData in bookList])
+    for bookData, size in zip(bookList, sizes):
+        title = bookData['title']
+        if size is None:
             print(colored(f'Error when loading title {title} metadata', 'red'))
-            print(colored(sys.exc_info(), 'red'))
             continue
-
+        outSize += size
         print(f'..{title} loaded')
 
     return outSize
@@ -254,8 +261,17 @@ if __name__ == "__main__":
                         help="Maximum size to load in Tb")
     parser.add_argument('--startOffset', type=int, default=0)
     parser.add_argument('--maxOffset', type=int, default=-1)
+    parser.add_argument('--n_workers', type=int, default=8,
+                        help="Number of web pages fetched concurrently")
+    parser.add_argument('--http_cache', type=str,
+                        default=fetch.DEFAULT_CACHE_DIR,
+                        help="Directory where the fetched web pages are "
+                        "cached")
+    parser.add_argument('--n_downloads', type=int, default=4,
+                        help="Number of audio files downloaded concurrently")
 
     args = parser.parse_args()
+    fetch.configure(cache_dir=args.http_cache, n_workers=args.n_workers)
 
     if not os.path.isdir(args.output_dir):
         os.mkdir(args.output_dir)
@@ -280,18 +296,23 @@ if __name__ == "__main__":
     if os.path.isfile(pathSize):
         fullSize = load_tmp(pathSize)
 
+    # Keeps track of the completed downloads in output_dir/manifest.json
+    manager = DownloadManager(args.output_dir, n_workers=args.n_downloads)
+
     while True:
         if args.getSize:
             size = get_size_page(url,
                                  offset,
                                  offsetStep,
-                                 args.language)
+                                 args.language,
+                                 manager)
         else:
             size = import_page(url,
                                offset,
                                offsetStep,
                                args.output_dir,
-                               args.language)
+                               args.language,
+                               manager=manager)
         if size < 0:
             break
         fullSize += size
@@ -0,0 +1,172 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+class DownloadManager:
+    r"""
+    Downloads large files n_workers at a time into dir_out.
+
+    A transfer is written to <name>.part and renamed once its size (and md5,
+    when one is given) has been checked. An interrupted transfer is resumed
+    from its last complete chunk with an HTTP Range request. The completed
+    downloads are recorded in dir_out/manifest.json, so that they are
+    skipped by the next runs.
+    """
+
+    def __init__(self, dir_out, n_workers=4, chunk_size=2**16, max_retries=5,
+                 backoff_s=1., timeout_s=60.):
+        self.dir_out = dir_out
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=n_workers,
+                                                pool_maxsize=n_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        os.makedirs(dir_out, exist_ok=True)
+        self.path_manifest = os.path.join(dir_out, 'manifest.json')
+        self.manifest = {}
+        if os.path.isfile(self.path_manifest):
+            with open(self.path_manifest, 'r') as file:
+                self.manifest = json.load(file)
+        self.lock = threading.Lock()
+
+    def save_manifest(self):
+        with self.lock:
+            data = json.dumps(self.manifest, indent=1)
+            tmp_path = self.path_manifest + '.tmp'
+            with open(tmp_path, 'w') as file:
+                file.write(data)
+            os.replace(tmp_path, self.path_manifest)
+
+    def is_done(self, name):
+        entry = self.manifest.get(name)
+        if entry is None:
+            return False
+        path_out = os.path.join(self.dir_out, name)
+        return os.path.isfile(path_out) \
+            and os.path.getsize(path_out) == entry['size']
+
+    def _retry(self, fn, *args):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn(*args)
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError, DownloadError):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_s * 2 ** attempt)
+
+    def _head_size(self, url):
+        response = self.session.head(url, allow_redirects=True,
+                                     timeout=self.timeout_s)
+        if response.status_code >= 500:
+            raise DownloadError(f"{url}: HTTP {response.status_code}")
+        if not response.ok or 'Content-Length' not in response.headers:
+            return None
+        return int(response.headers['Content-Length'])
+
+    def head_size(self, url):
+        r"""
+        Returns the size of url in bytes, without downloading it, or None if
+        the server doesn't tell.
+        """
+        return self._retry(self._head_size, url)
+
+    def _transfer(self, url, path_part, size):
+        offset = os.path.getsize(path_part) \
+            if os.path.isfile(path_part) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset > 0 else {}
+        with self.session.get(url, headers=headers, stream=True,
+                              timeout=self.timeout_s) as response:
+            if response.status_code == 416:
+                # Nothing left to download
+                return
+            if response.status_code >= 500:
+                raise DownloadError(f"{url}: HTTP {response.status_code}")
+            if not response.ok:
+                raise RuntimeError(f"{url}: HTTP {response.status_code}")
+            # 200 instead of 206: the server ignored the range, start over
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            with open(path_part, mode) as file:
+                for chunk in response.iter_content(self.chunk_size):
+                    file.write(chunk)
+        # The connection was closed early: resume on the next attempt
+        if size is not None and os.path.getsize(path_part) < size:
+            raise DownloadError(f"{url}: incomplete transfer")
+
+    def download(self, url, name, size=None, md5=None):
+        r"""
+        Downloads url into dir_out/name and returns the number of bytes
+        transferred by this call (0 if the file was already complete).
+        size is fetched with a HEAD request if not given.
+        """
+        if self.is_done(name):
+            return 0
+
+        path_out = os.path.join(self.dir_out, name)
+        path_part = path_out + '.part'
+        if size is None:
+            size = self.head_size(url)
+        offset = os.path.getsize(path_part) \
+            if os.path.isfile(path_part) else 0
+        if size is not None and offset > size:
+            os.remove(path_part)
+            offset = 0
+
+        self._retry(self._transfer, url, path_part, size)
+
+        part_size = os.path.getsize(path_part)
+        file_md5 = hashlib.md5()
+        with open(path_part, 'rb') as file:
+            for chunk in iter(lambda: file.read(self.chunk_size), b''):
+                file_md5.update(chunk)
+        file_md5 = file_md5.hexdigest()
+
+        if (size is not None and part_size != size) or \
+                (md5 is not None and file_md5 != md5):
+            # Corrupted: the next attempt restarts from scratch
+            os.remove(path_part)
+            raise DownloadError(f"{url}: invalid download, {part_size} bytes "
+                                f"(expected {size}), md5 {file_md5}")
+
+        os.replace(path_part, path_out)
+        with self.lock:
+            self.manifest[name] = {'url': url, 'size': part_size,
+                                   'md5': file_md5}
+        self.save_manifest()
+        return part_size - offset
+
+    def _download_task(self, task):
+        url, name, size, md5 = task
+        try:
+            return name, self.download(url, name, size=size, md5=md5), None
+        except (RuntimeError, requests.RequestException) as error:
+            return name, 0, error
+
+    def download_all(self, tasks):
+        r"""
+        Runs the (url, name, size, md5) tasks with n_workers concurrent
+        transfers, size and md5 can be None. Yields
+        (name, n_bytes, error or None), in order of completion.
+        """
+        with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            futures = [executor.submit(self._download_task, task)
+                       for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
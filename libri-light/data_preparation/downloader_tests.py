@@ -0,0 +1,169 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import hashlib
+import http.server
+import json
+import os
+import tempfile
+import threading
+import unittest
+from downloader import DownloadManager, DownloadError
+
+
+class _FileHandler(http.server.BaseHTTPRequestHandler):
+    r"""
+    Serves server.files[path], with Range support. The first
+    server.n_truncated transfers stop after half of the file.
+    """
+
+    def _send_headers(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.end_headers()
+            return None, 0
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header is not None and self.server.support_range:
+            start = int(range_header[len('bytes='):].rstrip('-'))
+            if start >= len(data):
+                self.send_response(416)
+                self.end_headers()
+                return None, 0
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             f'bytes {start}-{len(data) - 1}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+        return data, start
+
+    def do_HEAD(self):
+        self.server.n_heads += 1
+        self._send_headers()
+
+    def do_GET(self):
+        data, start = self._send_headers()
+        if data is None:
+            return
+        self.server.ranges.append(start)
+        data = data[start:]
+        if self.server.n_truncated > 0:
+            self.server.n_truncated -= 1
+            self.wfile.write(data[:len(data) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownloadManager(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                     _FileHandler)
+        self.server.files = {f'/book{i}.zip': os.urandom(10000 + i)
+                             for i in range(8)}
+        self.server.support_range = True
+        self.server.n_truncated = 0
+        self.server.n_heads = 0
+        self.server.ranges = []
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.dir_out = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir_out.cleanup()
+
+    def manager(self, **kwargs):
+        return DownloadManager(self.dir_out.name, backoff_s=0.01, **kwargs)
+
+    def url_data(self, name):
+        return f'{self.base_url}/{name}', self.server.files[f'/{name}']
+
+    def read(self, name):
+        with open(os.path.join(self.dir_out.name, name), 'rb') as file:
+            return file.read()
+
+    def test_head_size(self):
+        self.assertEqual(self.manager().head_size(
+            f'{self.base_url}/book3.zip'), 10003)
+        self.assertIsNone(self.manager().head_size(
+            f'{self.base_url}/missing.zip'))
+
+    def test_download_all(self):
+        tasks = [(f'{self.base_url}/book{i}.zip', f'book{i}.zip', None, None)
+                 for i in range(8)]
+        results = list(self.manager(n_workers=4).download_all(tasks))
+        self.assertEqual(sorted(name for name, _, _ in results),
+                         [f'book{i}.zip' for i in range(8)])
+        self.assertTrue(all(error is None for _, _, error in results))
+        for i in range(8):
+            self.assertEqual(self.read(f'book{i}.zip'),
+                             self.server.files[f'/book{i}.zip'])
+
+        # A new manager, as in a second run, skips everything
+        n_gets = len(self.server.ranges)
+        results = list(self.manager().download_all(tasks))
+        self.assertEqual(sum(size for _, size, _ in results), 0)
+        self.assertEqual(len(self.server.ranges), n_gets)
+
+        with open(os.path.join(self.dir_out.name, 'manifest.json')) as file:
+            manifest = json.load(file)
+        self.assertEqual(manifest['book3.zip']['size'], 10003)
+
+    def test_resume(self):
+        url, data = self.url_data('book0.zip')
+        self.server.n_truncated = 1
+        # What was received is kept, up to the last complete chunk
+        self.manager(chunk_size=1000).download(url, 'book0.zip')
+        self.assertEqual(self.read('book0.zip'), data)
+        self.assertEqual(self.server.ranges, [0, 5000])
+
+    def test_resume_partial_file(self):
+        url, data = self.url_data('book1.zip')
+        path_part = os.path.join(self.dir_out.name, 'book1.zip.part')
+        with open(path_part, 'wb') as file:
+            file.write(data[:1234])
+        n_bytes = self.manager().download(url, 'book1.zip')
+        self.assertEqual(n_bytes, len(data) - 1234)
+        self.assertEqual(self.read('book1.zip'), data)
+        self.assertEqual(self.server.ranges, [1234])
+
+        # Servers without Range support send the whole file again
+        self.server.support_range = False
+        self.server.ranges = []
+        with open(os.path.join(self.dir_out.name, 'book2.zip.part'),
+                  'wb') as file:
+            file.write(b'x' * 1234)
+        self.manager().download(f'{self.base_url}/book2.zip', 'book2.zip')
+        self.assertEqual(self.read('book2.zip'),
+                         self.server.files['/book2.zip'])
+
+    def test_checksum(self):
+        url, data = self.url_data('book0.zip')
+        manager = self.manager()
+        with self.assertRaises(DownloadError):
+            manager.download(url, 'book0.zip', md5='0' * 32)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.dir_out.name, 'book0.zip')))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.dir_out.name, 'book0.zip.part')))
+        manager.download(url, 'book0.zip',
+                         md5=hashlib.md5(data).hexdigest())
+        self.assertEqual(self.read('book0.zip'), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache',
+                                 'librilight', 'http')
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class Fetcher:
+    r"""
+    Fetches web pages through a single pooled requests.Session.
+
+    Successful responses are cached on disk, keyed by URL. A cached response
+    younger than max_age_s is returned without any request; an older one is
+    revalidated with its ETag / Last-Modified headers. Connection errors and
+    transient HTTP errors are retried with an exponential backoff.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, n_workers=8,
+                 max_age_s=24 * 3600., max_retries=5, backoff_s=1.,
+                 timeout_s=60.):
+        self.cache_dir = None if cache_dir is None else str(cache_dir)
+        self.n_workers = n_workers
+        self.max_age_s = max_age_s
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=n_workers,
+                                                pool_maxsize=n_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _cache_paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + '.json', base + '.body'
+
+    def _load_cached(self, url):
+        if self.cache_dir is None:
+            return None, None
+        path_meta, path_body = self._cache_paths(url)
+        try:
+            with open(path_meta, 'r') as file:
+                meta = json.load(file)
+            with open(path_body, 'rb') as file:
+                body = file.read()
+        except (OSError, ValueError):
+            return None, None
+        if meta.get('url') != url:
+            return None, None
+        return meta, body
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                        suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def _save_cached(self, url, response):
+        if self.cache_dir is None:
+            return
+        path_meta, path_body = self._cache_paths(url)
+        os.makedirs(os.path.dirname(path_meta), exist_ok=True)
+        meta = {'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched': time.time()}
+        # The body goes first: a meta-data file always has its body
+        self._write_atomic(path_body, response.content)
+        self._write_atomic(path_meta, json.dumps(meta).encode('utf-8'))
+
+    def _touch_cached(self, url, meta):
+        meta['fetched'] = time.time()
+        path_meta, _ = self._cache_paths(url)
+        self._write_atomic(path_meta, json.dumps(meta).encode('utf-8'))
+
+    def _request(self, url, headers):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(url, headers=headers,
+                                            timeout=self.timeout_s)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                response = None
+
+            if response is not None and \
+                    response.status_code not in RETRY_STATUS:
+                return response
+            if response is not None and attempt == self.max_retries:
+                return response
+
+            delay = self.backoff_s * 2 ** attempt
+            if response is not None and \
+                    response.headers.get('Retry-After', '').isdigit():
+                delay = max(delay, int(response.headers['Retry-After']))
+            time.sleep(delay)
+
+    def get(self, url):
+        r"""
+        Returns the content of url, as bytes.
+        """
+        meta, body = self._load_cached(url)
+        headers = {}
+        if meta is not None:
+            if self.max_age_s is not None and \
+                    time.time() - meta['fetched'] < self.max_age_s:
+                return body
+            if meta['etag'] is not None:
+                headers['If-None-Match'] = meta['etag']
+            if meta['last_modified'] is not None:
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = self._request(url, headers)
+        if response.status_code == 304 and meta is not None:
+            self._touch_cached(url, meta)
+            return body
+        if not response.ok:
+            raise RuntimeError(
+                f"Failed to fetch {url}: HTTP {response.status_code}")
+        self._save_cached(url, response)
+        return response.content
+
+    def get_json(self, url):
+        return json.loads(self.get(url).decode('utf-8'))
+
+    def map(self, fn, items):
+        r"""
+        Applies fn to all items with n_workers threads, keeping the order of
+        items. fn is expected to spend its time fetching pages.
+        """
+        with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            yield from executor.map(fn, items)
+
+
+_FETCHER = None
+
+
+def configure(**kwargs):
+    r"""
+    Replaces the shared Fetcher by Fetcher(**kwargs).
+    """
+    global _FETCHER
+    _FETCHER = Fetcher(**kwargs)
+    return _FETCHER
+
+
+def get_fetcher():
+    global _FETCHER
+    if _FETCHER is None:
+        _FETCHER = Fetcher()
+    return _FETCHER
+
+
+def get(url):
+    return get_fetcher().get(url)
+
+
+def get_json(url):
+    return get_fetcher().get_json(url)
+
+
+def thread_map(fn, items):
+    return get_fetcher().map(fn, items)
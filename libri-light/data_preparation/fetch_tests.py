@@ -0,0 +1,114 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import http.server
+import tempfile
+import threading
+import unittest
+from fetch import Fetcher
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        server.n_requests += 1
+        if self.path == '/flaky' and server.n_failures > 0:
+            server.n_failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path == '/missing':
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == server.etag:
+            server.n_revalidated += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = server.body
+        self.send_response(200)
+        self.send_header('ETag', server.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                     _Handler)
+        self.server.n_requests = 0
+        self.server.n_revalidated = 0
+        self.server.n_failures = 0
+        self.server.etag = '"v1"'
+        self.server.body = b'<html>page</html>'
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache_dir.cleanup()
+
+    def test_cache_hit(self):
+        url = f'{self.base_url}/page'
+        fetcher = Fetcher(cache_dir=self.cache_dir.name)
+        self.assertEqual(fetcher.get(url), b'<html>page</html>')
+        # A new fetcher, as in a second run, reads the cache
+        fetcher = Fetcher(cache_dir=self.cache_dir.name)
+        self.assertEqual(fetcher.get(url), b'<html>page</html>')
+        self.assertEqual(self.server.n_requests, 1)
+
+    def test_etag_revalidation(self):
+        url = f'{self.base_url}/page'
+        fetcher = Fetcher(cache_dir=self.cache_dir.name, max_age_s=0)
+        fetcher.get(url)
+        self.assertEqual(fetcher.get(url), b'<html>page</html>')
+        self.assertEqual(self.server.n_revalidated, 1)
+
+        self.server.etag = '"v2"'
+        self.server.body = b'<html>new page</html>'
+        self.assertEqual(fetcher.get(url), b'<html>new page</html>')
+        self.assertEqual(self.server.n_requests, 3)
+
+    def test_retry(self):
+        self.server.n_failures = 2
+        fetcher = Fetcher(cache_dir=None, backoff_s=0.01)
+        self.assertEqual(fetcher.get(f'{self.base_url}/flaky'),
+                         b'<html>page</html>')
+        self.assertEqual(self.server.n_requests, 3)
+
+        self.server.n_failures = 5
+        fetcher = Fetcher(cache_dir=None, max_retries=2, backoff_s=0.01)
+        with self.assertRaises(RuntimeError):
+            fetcher.get(f'{self.base_url}/flaky')
+
+    def test_error_not_cached(self):
+        url = f'{self.base_url}/missing'
+        fetcher = Fetcher(cache_dir=self.cache_dir.name)
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                fetcher.get(url)
+        self.assertEqual(self.server.n_requests, 2)
+
+    def test_map(self):
+        fetcher = Fetcher(cache_dir=self.cache_dir.name, n_workers=4)
+        urls = [f'{self.base_url}/page{i}' for i in range(16)]
+        out = list(fetcher.map(fetcher.get, urls))
+        self.assertEqual(out, [b'<html>page</html>'] * 16)
+        self.assertEqual(self.server.n_requests, 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
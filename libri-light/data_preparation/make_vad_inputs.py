@@ -1,13 +1,113 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 import os
+import json
 from pathlib import Path
-import torchaudio
-import progressbar
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import time
+import numpy as np
+import soundfile as sf
 import argparse
-import torch
 import tqdm
 
 
+def _pack_strings(strings):
+    encoded = [x.encode('utf-8') for x in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob, offsets):
+    data = blob.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8')
+            for i in range(len(offsets) - 1)]
+
+
+def load_seqs_index(index_path, extension):
+    r"""
+    Loads the directory index saved by save_seqs_index as a dictionary
+    relative_dir -> (mtime_ns, subdirectories, sequence file names).
+    Returns an empty index if the file does not exist or was built for
+    another extension.
+    """
+    if not os.path.isfile(index_path):
+        return {}
+    data = np.load(index_path)
+    if str(data['extension']) != extension:
+        return {}
+    dirs = _unpack_strings(data['dir_blob'], data['dir_offsets'])
+    files = _unpack_strings(data['file_blob'], data['file_offsets'])
+    index = {dir_name: (int(mtime), [], [])
+             for dir_name, mtime in zip(dirs, data['dir_mtimes'])}
+    for dir_name, parent in zip(dirs, data['dir_parents']):
+        if parent >= 0:
+            index[dirs[parent]][1].append(os.path.basename(dir_name))
+    for file_name, dir_id in zip(files, data['file_dirs']):
+        index[dirs[dir_id]][2].append(file_name)
+    return index
+
+
+def save_seqs_index(index_path, extension, index):
+    r"""
+    Saves the directory index as columnar arrays: one packed blob for the
+    directory names, one for the sequence file names, and integer arrays
+    for the directory mtimes, parents and the directory of each file.
+    """
+    dirs = sorted(index)
+    dir_ids = {dir_name: i for i, dir_name in enumerate(dirs)}
+    dir_parents = np.array([dir_ids[os.path.dirname(dir_name)]
+                            if dir_name else -1 for dir_name in dirs],
+                           dtype=np.int64)
+    dir_mtimes = np.array([index[dir_name][0] for dir_name in dirs],
+                          dtype=np.int64)
+    files, file_dirs = [], []
+    for dir_id, dir_name in enumerate(dirs):
+        files += index[dir_name][2]
+        file_dirs += [dir_id] * len(index[dir_name][2])
+    dir_blob, dir_offsets = _pack_strings(dirs)
+    file_blob, file_offsets = _pack_strings(files)
+    tmp_path = index_path + '.tmp.npz'
+    np.savez(tmp_path, extension=np.array(extension),
+             dir_blob=dir_blob, dir_offsets=dir_offsets,
+             dir_mtimes=dir_mtimes, dir_parents=dir_parents,
+             file_blob=file_blob, file_offsets=file_offsets,
+             file_dirs=np.array(file_dirs, dtype=np.int64))
+    os.replace(tmp_path, index_path)
+
+
+def scan_tree(dirName, extension, previous_index):
+    r"""
+    Walks dirName and returns its directory index. Directories whose mtime
+    did not change since previous_index are not listed again: their
+    subdirectories and sequences are taken from previous_index.
+    """
+    index = {}
+    n_scanned = 0
+    to_visit = ['']
+    while len(to_visit) > 0:
+        dir_name = to_visit.pop()
+        mtime = os.stat(os.path.join(dirName, dir_name)).st_mtime_ns
+        previous = previous_index.get(dir_name)
+        if previous is not None and previous[0] == mtime:
+            subdirs, files = previous[1], previous[2]
+        else:
+            n_scanned += 1
+            subdirs, files = [], []
+            with os.scandir(os.path.join(dirName, dir_name)) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.name.endswith(extension):
+                        files.append(entry.name)
+            subdirs.sort()
+            files.sort()
+        index[dir_name] = (mtime, subdirs, files)
+        to_visit += [os.path.join(dir_name, x) for x in reversed(subdirs)]
+    print(f'{n_scanned} out of {len(index)} directories scanned')
+    return index
+
+
 def findAllSeqs(dirName,
                 extension='.flac',
                 loadCache=False):
@@ -31,65 +131,99 @@ def findAllSeqs(dirName,
             \..
                 ...
                 seqName.extension
+
+    The directory tree is indexed in dirName/_seqs_index.npz. If loadCache is
+    True, only the directories modified since the index was saved are listed
+    again.
     """
-    cache_path = os.path.join(dirName, '_seqs_cache.txt')
+    index_path = os.path.join(dirName, '_seqs_index.npz')
+    previous_index = {}
     if loadCache:
         try:
-            outSequences, speakers = torch.load(cache_path)
-            print(f'Loaded from cache {cache_path} successfully')
-            return outSequences, speakers
-        except OSError as err:
-            print(f'Ran in an error while loading {cache_path}: {err}')
-        print('Could not load cache, rebuilding')
-
-    if dirName[-1] != os.sep:
-        dirName += os.sep
-    prefixSize = len(dirName)
+            previous_index = load_seqs_index(index_path, extension)
+            print(f'Loaded index {index_path} with {len(previous_index)} '
+                  'directories')
+        except (OSError, ValueError, KeyError) as err:
+            print(f'Ran in an error while loading {index_path}: {err}')
+
+    index = scan_tree(dirName, extension, previous_index)
+
     speakersTarget = {}
     outSequences = []
-    for root, dirs, filenames in tqdm.tqdm(os.walk(dirName)):
-        filtered_files = [f for f in filenames if f.endswith(extension)]
-
+    for dir_name in sorted(index):
+        filtered_files = index[dir_name][2]
         if len(filtered_files) > 0:
-            speakerStr = root[prefixSize:].split(os.sep)[0]
+            speakerStr = dir_name.split(os.sep)[0]
             if speakerStr not in speakersTarget:
                 speakersTarget[speakerStr] = len(speakersTarget)
             speaker = speakersTarget[speakerStr]
             for filename in filtered_files:
-                full_path = os.path.join(root[prefixSize:], filename)
+                full_path = os.path.join(dir_name, filename)
                 outSequences.append((speaker, full_path))
     outSpeakers = [None for x in speakersTarget]
-    for key, index in speakersTarget.items():
-        outSpeakers[index] = key
+    for key, index_speaker in speakersTarget.items():
+        outSpeakers[index_speaker] = key
     try:
-        torch.save((outSequences, outSpeakers), cache_path)
-        print(f'Saved cache file at {cache_path}')
+        save_seqs_index(index_path, extension, index)
+        print(f'Saved index file at {index_path}')
     except OSError as err:
-        print(f'Ran in an error while saving {cache_path}: {err}')
+        print(f'Ran in an error while saving {index_path}: {err}')
     return outSequences, outSpeakers
 
 
 def get_file_duration_ms(path_file):
-    info = torchaudio.info(path_file)[0]
-    return 1000*(info.length // (info.rate))
+    info = sf.info(path_file)
+    return 1000*(info.frames // info.samplerate)
 
 
-def get_lst(path_db, file_list):
+def _probe_duration(task):
+    path_file, cached = task
+    stat = os.stat(path_file)
+    key = [stat.st_size, stat.st_mtime_ns]
+    if cached is not None and cached[:2] == key:
+        return key + cached[2:]
+    return key + [get_file_duration_ms(path_file)]
 
-    bar = progressbar.ProgressBar(maxval=len(file_list))
-    bar.start()
 
+def load_duration_cache(path_cache):
+    if path_cache is None or not os.path.isfile(path_cache):
+        return {}
+    with open(path_cache, 'r') as file:
+        return json.load(file)
+
+
+def save_duration_cache(path_cache, cache):
+    tmp_path = path_cache + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(cache, file)
+    os.replace(tmp_path, path_cache)
+
+
+def get_lst(path_db, file_list, n_processes=16, path_cache=None,
+            loadCache=True):
+    r"""
+    Builds the (id, path, duration in ms) entries of the VAD input list.
+    Durations are read from the audio headers only, in parallel, and
+    memoized in path_cache under each file path together with the size and
+    mtime of the file, so that unchanged files are never opened again.
+    """
     path_db = Path(path_db)
-    out = []
+    full_paths = [str(path_db / file_name) for file_name in file_list]
+    cache = load_duration_cache(path_cache) if loadCache else {}
 
-    for index, file_name in enumerate(file_list):
+    tasks = [(path, cache.get(path)) for path in full_paths]
+    with multiprocessing.Pool(processes=n_processes) as pool:
+        probes = list(tqdm.tqdm(pool.imap(_probe_duration, tasks,
+                                          chunksize=64),
+                                total=len(tasks)))
 
-        bar.update(index)
-        full_path = str(path_db / file_name)
-        duration = get_file_duration_ms(full_path)
-        out.append((full_path, full_path, int(duration)))
+    out = []
+    for full_path, probe in zip(full_paths, probes):
+        cache[full_path] = probe
+        out.append((full_path, full_path, int(probe[2])))
 
-    bar.finish()
+    if path_cache is not None:
+        save_duration_cache(path_cache, cache)
     return out
 
 
@@ -100,19 +234,89 @@ def save_lst(data, path_out):
             file.write(' '.join((id, path, str(val))) + '\n')
 
 
-def reorder_vad(path_vad, lst):
+def load_lst(path_lst):
+
+    with open(path_lst, 'r') as file:
+        data = [line.split() for line in file]
+    return [(id, path, int(val)) for id, path, val in data]
+
+
+def relative_to_db(path, path_db):
+    r"""
+    Path of path relative to path_db, whatever their spelling: relative or
+    absolute paths, trailing slashes, symbolic links.
+    """
+    for normalize in [os.path.abspath, os.path.realpath]:
+        relative_path = os.path.relpath(normalize(path), normalize(path_db))
+        if relative_path.split(os.sep)[0] != os.pardir:
+            return relative_path
+    raise ValueError(f"{path} is not in {path_db}")
+
+
+def plan_reorder_vad(path_vad, lst, path_db, batch_size=256):
+    r"""
+    Lists the operations done by reorder_vad, grouped by source directory
+    and cut into batches of at most batch_size files. Each operation is a
+    tuple (vad file, destination, [sidecar files to delete]).
 
+    The VAD outputs are looked up in path_vad, at the path of their audio
+    file relative to path_db (the ids of lst are the audio paths built by
+    get_lst).
+    """
     path_vad = Path(path_vad)
+    dir2ops = {}
 
     for id, full_path_wav, _ in lst:
 
-        full_path_vad = (path_vad / id).with_suffix('.vad')
+        relative_path = relative_to_db(id, path_db)
+        full_path_vad = (path_vad / relative_path).with_suffix('.vad')
         full_path_out = Path(full_path_wav).with_suffix('.vad')
+        sidecars = [full_path_vad.with_suffix(x)
+                    for x in ['.fwt', '.tsc', '.sts']]
+        dir2ops.setdefault(full_path_vad.parent, []).append(
+            (full_path_vad, full_path_out, sidecars))
+
+    return [ops[i:i + batch_size] for ops in dir2ops.values()
+            for i in range(0, len(ops), batch_size)]
+
+
+def _apply_vad_ops(ops):
+    for full_path_vad, full_path_out, sidecars in ops:
         full_path_vad.replace(full_path_out)
+        for path in sidecars:
+            path.unlink(missing_ok=True)
+    return len(ops)
 
-        full_path_vad.with_suffix('.fwt').unlink(missing_ok=True)
-        full_path_vad.with_suffix('.tsc').unlink(missing_ok=True)
-        full_path_vad.with_suffix('.sts').unlink(missing_ok=True)
+
+def reorder_vad(path_vad, lst, path_db, n_threads=64, dry_run=False):
+    r"""
+    Moves the .vad files produced for the entries of lst next to their
+    audio file and removes the other outputs of the VAD. Each move costs a
+    few metadata round-trips, so batches are run concurrently in a pool of
+    n_threads threads. With dry_run, the planned operations are only
+    printed.
+    """
+    batches = plan_reorder_vad(path_vad, lst, path_db)
+    n_files = sum(len(x) for x in batches)
+    print(f'{n_files} vad files to move in {len(batches)} batches')
+
+    if dry_run:
+        for ops in batches:
+            for full_path_vad, full_path_out, sidecars in ops:
+                print(f'mv {full_path_vad} {full_path_out}')
+                print('rm -f ' + ' '.join(str(x) for x in sidecars))
+        return batches
+
+    start_time = time.time()
+    n_done = 0
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        for n_moved in tqdm.tqdm(pool.map(_apply_vad_ops, batches),
+                                 total=len(batches)):
+            n_done += n_moved
+    elapsed = time.time() - start_time
+    print(f'Moved {n_done} vad files in {elapsed:.1f}s, '
+          f'{n_done / max(elapsed, 1e-6):.1f} file/s')
+    return batches
 
 
 if __name__ == "__main__":
@@ -125,15 +329,35 @@ if __name__ == "__main__":
     parser.add_argument('--ignore_cache', action='store_true')
     parser.add_argument('--debug', action='store_true')
     parser.add_argument('--extension', type=str, default='.wav')
+    parser.add_argument('--n_processes', type=int, default=16,
+                        help="Number of processes reading the audio headers")
+    parser.add_argument('--reorder_from', type=str, default=None,
+                        help="If given, instead of building path_out, move "
+                        "the .vad files computed for path_out from this "
+                        "directory to the dataset. The .vad files must be "
+                        "at the same relative paths as their audio files "
+                        "in path_db")
+    parser.add_argument('--n_threads', type=int, default=64,
+                        help="Number of threads used to move the .vad files")
+    parser.add_argument('--dry_run', action='store_true',
+                        help="With --reorder_from, only print the moves")
 
     args = parser.parse_args()
 
-    seqList, _ = findAllSeqs(args.path_db, extension=args.extension,
-                             loadCache=not args.ignore_cache)
-    if args.debug:
-        seqList = seqList[:10]
-
-    seqList = [i[1] for i in seqList]
-
-    vad_data = get_lst(args.path_db, seqList)
-    save_lst(vad_data, args.path_out)
+    if args.reorder_from is not None:
+        reorder_vad(args.reorder_from, load_lst(args.path_out), args.path_db,
+                    n_threads=args.n_threads, dry_run=args.dry_run)
+    else:
+        seqList, _ = findAllSeqs(args.path_db, extension=args.extension,
+                                 loadCache=not args.ignore_cache)
+        if args.debug:
+            seqList = seqList[:10]
+
+        seqList = [i[1] for i in seqList]
+
+        path_cache = os.path.join(args.path_db, '_durations_cache.json')
+        vad_data = get_lst(args.path_db, seqList,
+                           n_processes=args.n_processes,
+                           path_cache=path_cache,
+                           loadCache=not args.ignore_cache)
+        save_lst(vad_data, args.path_out)
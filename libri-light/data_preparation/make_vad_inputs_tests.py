@@ -0,0 +1,82 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from make_vad_inputs import reorder_vad, plan_reorder_vad
+
+
+class TestReorderVad(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path_db = os.path.join(self.tmp_dir.name, 'db')
+        self.path_vad = Path(self.tmp_dir.name) / 'vad'
+        self.lst = []
+        for name in ['a/1', 'a/2', 'b/3']:
+            path_wav = Path(self.path_db) / (name + '.wav')
+            path_wav.parent.mkdir(parents=True, exist_ok=True)
+            path_wav.touch()
+            self.lst.append((str(path_wav), str(path_wav), 1000))
+
+            path_out = self.path_vad / (name + '.vad')
+            path_out.parent.mkdir(parents=True, exist_ok=True)
+            path_out.write_text(name)
+            path_out.with_suffix('.sts').touch()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_reorder(self):
+        batches = reorder_vad(self.path_vad, self.lst, self.path_db,
+                              n_threads=2)
+        self.assertEqual(sum(len(x) for x in batches), 3)
+        for name in ['a/1', 'a/2', 'b/3']:
+            path_out = Path(self.path_db) / (name + '.vad')
+            self.assertEqual(path_out.read_text(), name)
+        self.assertEqual(list(self.path_vad.rglob('*.*')), [])
+
+    def test_dry_run(self):
+        batches = reorder_vad(self.path_vad, self.lst, self.path_db,
+                              dry_run=True)
+        self.assertEqual(sorted(str(op[0]) for ops in batches for op in ops),
+                         [str(self.path_vad / x)
+                          for x in ['a/1.vad', 'a/2.vad', 'b/3.vad']])
+        self.assertTrue((self.path_vad / 'a' / '1.vad').is_file())
+
+    def test_path_db_spelling(self):
+        expected = [str(self.path_vad / x)
+                    for x in ['a/1.vad', 'a/2.vad', 'b/3.vad']]
+
+        def planned(lst, path_db):
+            batches = plan_reorder_vad(self.path_vad, lst, path_db)
+            return sorted(str(op[0]) for ops in batches for op in ops)
+
+        self.assertEqual(planned(self.lst, self.path_db + os.sep), expected)
+
+        path_link = os.path.join(self.tmp_dir.name, 'link')
+        os.symlink(self.path_db, path_link)
+        self.assertEqual(planned(self.lst, path_link), expected)
+
+        # Relative paths in the .lst and / or for path_db
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.tmp_dir.name)
+            relative_lst = [(os.path.relpath(x), os.path.relpath(y), z)
+                            for x, y, z in self.lst]
+            self.assertEqual(planned(relative_lst, self.path_db), expected)
+            self.assertEqual(planned(self.lst, 'db'), expected)
+            self.assertEqual(planned(relative_lst, 'link'), expected)
+        finally:
+            os.chdir(cwd)
+
+        with self.assertRaises(ValueError):
+            planned(self.lst, os.path.join(self.path_db, 'a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,38 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 import os
 import json
+import multiprocessing
 import progressbar
 
 
-def getSameAuthorGroups(listMetadata, pathDIR):
+def _load_book_data(fullPath):
+    with open(fullPath, 'rb') as file:
+        data = json.load(file)
+    return data['authors'], data['title']
+
+
+def loadBooksData(listMetadata, pathDIR, n_workers=16):
+    r"""
+    Reads the authors and title of each book, opening each metadata file
+    once.
+    """
+    paths = [os.path.join(pathDIR, x) for x in listMetadata]
+    with multiprocessing.Pool(processes=n_workers) as pool:
+        data = pool.map(_load_book_data, paths, chunksize=64)
+    return dict(zip(listMetadata, data))
+
+
+def getSameAuthorGroups(listMetadata, pathDIR, booksData=None):
+
+    if booksData is None:
+        booksData = loadBooksData(listMetadata, pathDIR)
 
     output = {}
     nEmpty = 0
     nSeverals = 0
     for metadata_name in listMetadata:
 
-        fullPath = os.path.join(pathDIR, metadata_name)
-        with open(fullPath, 'rb') as file:
-            authorsData = json.load(file)['authors']
+        authorsData = booksData[metadata_name][0]
 
         if len(authorsData) == 0:
             authorIDs = [-1]
@@ -109,12 +128,15 @@ def getBaseTitle(title):
 
 def prepareMatches(listMetadata, pathDIR):
 
-    authorGroups = getSameAuthorGroups(listMetadata, pathDIR)
+    booksData = loadBooksData(listMetadata, pathDIR)
+    authorGroups = getSameAuthorGroups(listMetadata, pathDIR, booksData)
     authorGroups = [list(authorGroups[x])
                     for x in authorGroups if len(authorGroups[x]) > 1]
     print(f"{len(authorGroups)} groups of books with the same author")
     print("Preparing the data...")
 
+    # A book can belong to several groups: compute its base title once
+    baseTitles = {}
     output = []
 
     bar = progressbar.ProgressBar(len(authorGroups))
@@ -122,14 +144,13 @@ def prepareMatches(listMetadata, pathDIR):
 
     for index, group in enumerate(authorGroups):
         bar.update(index)
-        nItems = len(group)
         match = []
-        for i in range(nItems):
-            pathMetadata = os.path.join(pathDIR, group[i])
-            with open(pathMetadata, 'rb') as file:
-                title_i = json.load(file)["title"]
-            baseTitle, code = getBaseTitle(title_i)
-            match.append((baseTitle, code, group[i]))
+        for metadata_name in group:
+            if metadata_name not in baseTitles:
+                baseTitles[metadata_name] = getBaseTitle(
+                    booksData[metadata_name][1])
+            baseTitle, code = baseTitles[metadata_name]
+            match.append((baseTitle, code, metadata_name))
         output.append(match)
     bar.finish()
 
@@ -137,30 +158,37 @@ def prepareMatches(listMetadata, pathDIR):
 
 
 def getPossibleMatches(allGroups):
+    r"""
+    In each group, the books sharing the same base title are candidates.
+    The first of them (in the group order) is the reference: the other
+    candidates are its duplicates if they have the same values for the
+    reference's tags (version, abridged and dramatic reading excluded).
+    Candidates are found with an index base title -> books instead of
+    comparing the books pairwise.
+    """
 
     output = []
     for group in allGroups:
-        group.sort(key=lambda x: x[0])
-        groupSize = len(group)
-        indexStart = 0
-        while indexStart < groupSize - 1:
+        title2books = {}
+        for item in group:
+            title2books.setdefault(item[0], []).append(item)
+
+        for title in sorted(title2books):
+            books = title2books[title]
+            if len(books) < 2:
+                continue
+            currTitle, currTags, currMetdataName = books[0]
             currMatch = []
-            currTitle, currTags, currMetdataName = group[indexStart]
-            for indexEnd in range(indexStart + 1, groupSize):
-                nextTitle, nextTags, nextMetadataName = group[indexEnd]
+            for nextTitle, nextTags, nextMetadataName in books[1:]:
                 isSame = True
-                if currTitle == nextTitle:
-                    for tag in currTags:
-                        if tag in ["version", "abridged", "dramatic reading"]:
-                            continue
-                        if nextTags.get(tag, None) != currTags[tag]:
-                            isSame = False
-                            break
-                    if isSame:
-                        currMatch.append(nextMetadataName)
-                else:
-                    break
-            indexStart = indexEnd
+                for tag in currTags:
+                    if tag in ["version", "abridged", "dramatic reading"]:
+                        continue
+                    if nextTags.get(tag, None) != currTags[tag]:
+                        isSame = False
+                        break
+                if isSame:
+                    currMatch.append(nextMetadataName)
             if len(currMatch) > 0:
                 currMatch.append(currMetdataName)
                 output.append(currMatch)
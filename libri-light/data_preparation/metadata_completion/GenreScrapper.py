@@ -2,8 +2,8 @@
 import json
 import os
 from html.parser import HTMLParser
-import requests
 import progressbar
+import fetch
 
 
 class GenreScapper(HTMLParser):
@@ -54,30 +54,29 @@ def getGenreFromMetadata(metadata):
 
     urlLibriVoxPage = metadata["url_librivox"]
     parser = GenreScapper()
-    req = requests.get(urlLibriVoxPage)
-    parser.feed(str(req._content))
+    parser.feed(str(fetch.get(urlLibriVoxPage)))
     return parser.getGenre()
 
 
+def _get_genre(pathMetadata):
+    with open(pathMetadata, 'rb') as file:
+        metadata = json.load(file)
+    try:
+        return getGenreFromMetadata(metadata)
+    except Exception:
+        return None
+
+
 def gather_all_genres(pathDIR, metadataList):
     out = []
     print("Retrieving all books' genres...")
     bar = progressbar.ProgressBar(maxval=len(metadataList))
     bar.start()
-    for index, fileName in enumerate(metadataList):
-
+    pathsMetadata = [os.path.join(pathDIR, fileName)
+                     for fileName in metadataList]
+    genres = fetch.thread_map(_get_genre, pathsMetadata)
+    for index, (fileName, genre) in enumerate(zip(metadataList, genres)):
         bar.update(index)
-        pathMetadata = os.path.join(pathDIR, fileName)
-        with open(pathMetadata, 'rb') as file:
-            metadata = json.load(file)
-
-        try:
-            genre = getGenreFromMetadata(metadata)
-        except KeyboardInterrupt:
-            break
-        except:
-            genre = None
-
         out.append((fileName, genre))
 
     bar.finish()
@@ -1,11 +1,11 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 from html.parser import HTMLParser
-import requests
 import json
 import os
 from .utilities import get_speaker_data_name
 from copy import deepcopy
 import progressbar
+import fetch
 
 
 class ReaderScrapper(HTMLParser):
@@ -39,11 +39,27 @@ class ReaderScrapper(HTMLParser):
 def get_librivox_reader_from_id(readerID):
     url = f"https://librivox.org/reader/{readerID}"
     parser = ReaderScrapper()
-    req = requests.get(url)
-    parser.feed(str(req._content))
+    parser.feed(str(fetch.get(url)))
     return parser.readerName
 
 
+def _get_reader_name(readerID):
+    try:
+        return get_librivox_reader_from_id(readerID)
+    except RuntimeError:
+        return None
+
+
+def fetch_reader_names(readerIDs, idMatch):
+    r"""
+    Completes idMatch with the names of the readerIDs it does not know yet,
+    fetching their pages concurrently.
+    """
+    missing = sorted({ID for ID in readerIDs if ID not in idMatch})
+    for ID, name in zip(missing, fetch.thread_map(_get_reader_name, missing)):
+        idMatch[ID] = name
+
+
 def updateDataWithNames(speakerData, idMatch):
 
     newData = deepcopy(speakerData)
@@ -54,14 +70,8 @@ def updateDataWithNames(speakerData, idMatch):
 
     newData["readers_names"] = []
 
-    for item in speakerData["readers"]:
-        if item is not None:
-            for ID in item:
-                if ID not in idMatch:
-                    try:
-                        idMatch[ID] = get_librivox_reader_from_id(ID)
-                    except RuntimeError:
-                        idMatch[ID] = None
+    fetch_reader_names([ID for item in speakerData["readers"]
+                        if item is not None for ID in item], idMatch)
 
     for item in speakerData["readers"]:
         if item is None:
@@ -85,19 +95,27 @@ def update_all_speaker_data(listMetadata, pathInDir, pathOutDir):
     if not os.path.isdir(pathOutDir):
         os.mkdir(pathOutDir)
 
-    bar = progressbar.ProgressBar(maxval=len(listMetadata))
-    bar.start()
+    allSpeakerData = []
+    for pathMetadata in listMetadata:
+        pathSpeakerData = get_speaker_data_name(pathMetadata)
+        with open(os.path.join(pathInDir, pathSpeakerData), 'rb') as file:
+            allSpeakerData.append((pathSpeakerData, json.load(file)))
 
+    # Fetch the names of all readers at once, so that the pages are
+    # downloaded concurrently
     idMatch = {None: None}
+    fetch_reader_names([ID for _, speakerData in allSpeakerData
+                        if speakerData["readers"] is not None
+                        for item in speakerData["readers"]
+                        if item is not None for ID in item], idMatch)
 
-    for index, pathMetadata in enumerate(listMetadata):
+    bar = progressbar.ProgressBar(maxval=len(listMetadata))
+    bar.start()
+
+    for index, (pathSpeakerData, speakerData) in enumerate(allSpeakerData):
         bar.update(index)
 
-        pathSpeakerData = get_speaker_data_name(pathMetadata)
         fullPathSpeakerData = os.path.join(pathInDir, pathSpeakerData)
-        with open(fullPathSpeakerData, 'rb') as file:
-            speakerData = json.load(file)
-
         outData = updateDataWithNames(speakerData, idMatch)
         pathOutData = os.path.join(pathOutDir, pathSpeakerData)
 
@@ -1,64 +1,140 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 from text_retrieval.guttenberg import is_guttenberg_url
 from .utilities import get_txt_name
+import itertools
+import multiprocessing
 import os
 import json
+import re
+import shutil
 import progressbar
 import sys
 sys.path.append('..')
 
 
-def loadData(pathFile):
+def _spaced_pattern(marker):
+    # Matches marker even with spaces between its characters
+    return re.compile(' *'.join(re.escape(c) for c in marker))
+
+
+START_PATTERN = _spaced_pattern("***START")
+END_PATTERN = _spaced_pattern("***END")
+NOT_FOUND_404 = "<h1>404 Not Found</h1><p>File not found.</p>"
 
-    with open(pathFile, 'r') as file:
-        data = file.readlines()
 
+def find_text_bounds(lines):
+    r"""
+    Reads the lines of a Gutenberg text lazily and returns the (start, end)
+    indexes of the lines of the book itself, without the Gutenberg header
+    and license. Returns None if the text has no header.
+    """
     indexStartProject = -1
     indexProducedBy = -1
     indexEndProject = -1
-    for index, line in enumerate(data):
+    nLines = 0
+    for index, line in enumerate(lines):
+        nLines = index + 1
         if indexStartProject < 0:
-            value = line.replace(' ', '').find("***START")
-            if value >= 0:
-                indexStartProject = index
-            elif line.find("CONTENTS") >= 0:
+            if START_PATTERN.search(line) is not None \
+                    or line.find("CONTENTS") >= 0:
                 indexStartProject = index
             else:
                 continue
 
-        value = line.replace(' ', '').find("***END")
-        if value >= 0:
+        if END_PATTERN.search(line) is not None:
             indexEndProject = index
             break
 
-        if indexProducedBy < 0:
-            value = line.find("Produced by")
-            if value >= 0:
-                indexProducedBy = index
+        if indexProducedBy < 0 and line.find("Produced by") >= 0:
+            indexProducedBy = index
 
     if indexStartProject < 0:
         return None
 
     if indexEndProject < 0:
-        indexEndProject = len(data)
+        indexEndProject = nLines
 
     startIndex = indexProducedBy + 1 if indexProducedBy > 0 \
         else indexStartProject + 1
-    while startIndex < len(data) and data[startIndex] == '\n':
-        startIndex += 1
+    return startIndex, indexEndProject
+
+
+def iter_text_lines(pathFile, bounds):
+    r"""
+    Yields the lines of pathFile between the given bounds, skipping the
+    empty lines at the beginning.
+    """
+    startIndex, endIndex = bounds
+    with open(pathFile, 'r') as file:
+        lines = itertools.islice(file, startIndex, endIndex)
+        lines = itertools.dropwhile(lambda line: line == '\n', lines)
+        yield from lines
+
+
+def get_text_bounds(pathFile):
+    with open(pathFile, 'r') as file:
+        return find_text_bounds(file)
+
+
+def loadData(pathFile):
+    bounds = get_text_bounds(pathFile)
+    if bounds is None:
+        return None
+    return ''.join(iter_text_lines(pathFile, bounds))
+
 
-    return ''.join(data[startIndex:indexEndProject])
+def clean_text_file(pathInFile, outPathFile):
+    r"""
+    Same as writing loadData(pathInFile) to outPathFile, but the text is
+    streamed: the memory used doesn't depend on the size of the book.
+    Returns False if the text doesn't have the expected format.
+    """
+    bounds = get_text_bounds(pathInFile)
+    if bounds is None:
+        return False
+    tmpPath = outPathFile + '.tmp'
+    with open(tmpPath, 'w') as file:
+        file.writelines(iter_text_lines(pathInFile, bounds))
+    os.replace(tmpPath, outPathFile)
+    return True
 
 
 def find404Error(pathFile):
     with open(pathFile, 'r') as file:
-        data = file.readlines()
+        return file.readline() == NOT_FOUND_404 and file.readline() == ''
+
+
+def _clean_text_data(task):
+    r"""
+    Returns the status of the text and, when it couldn't be cleaned, whether
+    it is a 404 error page.
+    """
+    metadataName, pathInDir, pathOutDir = task
+    textFileName = get_txt_name(metadataName)
+    pathInFile = os.path.join(pathInDir, textFileName)
+    outPathFile = os.path.join(pathOutDir, textFileName)
+
+    if not os.path.isfile(pathInFile):
+        return "missing", None
+
+    assert(pathInFile != outPathFile)
+
+    with open(os.path.join(pathInDir, metadataName), 'rb') as file:
+        urlSource = json.load(file)["url_text_source"]
 
-    return len(data) == 1 and \
-        data[0] == "<h1>404 Not Found</h1><p>File not found.</p>"
+    if not is_guttenberg_url(urlSource):
+        shutil.copyfile(pathInFile, outPathFile)
+        return "clear", None
 
+    if clean_text_file(pathInFile, outPathFile):
+        return "clear", None
 
-def clean_all_text_data(metadataList, pathInDir, pathOutDir):
+    if find404Error(pathInFile):
+        return "missing", True
+    return "noisy", False
+
+
+def clean_all_text_data(metadataList, pathInDir, pathOutDir, n_workers=16):
 
     pathInDir = os.path.abspath(pathInDir)
     pathOutDir = os.path.abspath(pathOutDir)
@@ -72,49 +148,28 @@ def clean_all_text_data(metadataList, pathInDir, pathOutDir):
     nCleaned = 0
     nMissing = 0
     nNotWorking = 0
-    emptyTxt = []
+    nEmpty = 0
     out = []
 
-    for index, metadataName in enumerate(metadataList):
-        bar.update(index)
-        textFileName = get_txt_name(metadataName)
-        pathInFile = os.path.join(pathInDir, textFileName)
-        outPathFile = os.path.join(pathOutDir, textFileName)
-
-        if not os.path.isfile(pathInFile):
-            status = "missing"
-            nMissing += 1
-        else:
-
-            assert(pathInFile != outPathFile)
-
-            with open(os.path.join(pathInDir, metadataName), 'rb') as file:
-                urlSource = json.load(file)["url_text_source"]
-
-            if not is_guttenberg_url(urlSource):
-                os.popen(f'cp {pathInFile} {outPathFile}')
-                status = "clear"
-            else:
-                outData = loadData(pathInFile)
-
-                if outData is None:
-                    nNotWorking += 1
-                    if find404Error(pathInFile):
-                        emptyTxt.append(pathInFile)
-                        status = "missing"
-                    else:
-                        status = "noisy"
-                else:
-                    with open(outPathFile, 'w') as file:
-                        file.write(outData)
-                    status = "clear"
-        out.append((metadataName, status))
-        nCleaned += 1
+    tasks = [(metadataName, pathInDir, pathOutDir)
+             for metadataName in metadataList]
+    with multiprocessing.Pool(processes=n_workers) as pool:
+        results = pool.imap(_clean_text_data, tasks, chunksize=16)
+        for index, (metadataName, (status, is404)) in \
+                enumerate(zip(metadataList, results)):
+            bar.update(index)
+            if is404 is None and status == "missing":
+                nMissing += 1
+            elif is404 is not None:
+                nNotWorking += 1
+                nEmpty += is404
+            out.append((metadataName, status))
+            nCleaned += 1
 
     bar.finish()
     print(f"Out of {len(metadataList)} items")
     print(f"{nCleaned} files were cleaned and saved to {pathOutDir}")
-    print(f"{nNotWorking} files didn't match the good format among which {len(emptyTxt)} were empty")
+    print(f"{nNotWorking} files didn't match the good format among which {nEmpty} were empty")
     print(f"{nMissing} files were missing")
     return out
 
@@ -1,12 +1,15 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 from pathlib import Path
-import pickle
 import json
+import soundfile as sf
 import torchaudio
 import progressbar
 import argparse
+import multiprocessing
 import os
 import matplotlib
+import corpus_table
+import data_cache
 from collections import namedtuple
 matplotlib.use('agg')
 
@@ -61,67 +64,72 @@ def getJSON(pathJSON):
         return json.load(file)
 
 
-def get_updated_metadata(update, path_dir_in, path_dir_out, tag):
+def _apply_metadata_update(task):
+    full_path, out_path, tags = task
+    data = getJSON(full_path)
+    new_data = {**data, **tags}
 
-    print(f"Updating metadata with tag {tag}")
-    n_items = len(update)
-    bar = progressbar.ProgressBar(maxval=n_items)
-    bar.start()
+    if out_path.is_file():
+        current = data if out_path == full_path else getJSON(out_path)
+        if current == new_data:
+            return False
 
-    for index, item in enumerate(update):
-        bar.update(index)
-        metadada_name, new_value = item
-        full_path = Path(path_dir_in) / metadada_name
-        with open(str(full_path), 'rb') as file:
-            data = json.load(file)
-        data[tag] = new_value
-        out_path = Path(path_dir_out) / metadada_name
-        with open(str(out_path), 'w') as file:
-            data = json.dump(data, file, indent=2)
-    bar.finish()
+    # Write through a temporary file: an interrupted run never leaves a
+    # truncated json behind
+    tmp_path = out_path.with_name(out_path.name + '.tmp')
+    with open(tmp_path, 'w') as file:
+        json.dump(new_data, file, indent=2)
+    os.replace(tmp_path, out_path)
+    return True
 
 
-def save_cache(path_cache, data):
-    path_cache = Path(path_cache)
-    print(f"Saving a cache at {path_cache}")
-    extension = path_cache.suffix
-    if extension == ".json":
-        with open(path_cache, 'w') as file:
-            return json.dump(data, file, indent=2)
-    elif extension == ".pkl":
-        with open(path_cache, 'wb') as file:
-            pickle.dump(data, file)
-    else:
-        raise ValueError(f"{extension} : Invalid format")
-
-
-def load_cache(path_cache, fallback_function, args=None,
-               save=True, ignore_cache=False):
-
-    path_cache = Path(path_cache)
-    if not path_cache.is_file() or ignore_cache:
-        print(f"No cache found at {path_cache}")
-    else:
-        print(f"Loading the cached data at {path_cache}...")
-        extension = path_cache.suffix
-        if extension == ".json":
-            try:
-                with open(path_cache, 'rb') as file:
-                    return json.load(file)
-            except json.decoder.JSONDecodeError:
-                print("Invalid cache.")
-        elif extension == ".pkl":
-            try:
-                with open(path_cache, 'rb') as file:
-                    return pickle.load(file)
-            except pickle.UnpicklingError:
-                print("Invalid cache.")
-        else:
-            raise ValueError(f"{extension} : Invalid format")
-    out = fallback_function(*args)
-    if save:
-        save_cache(path_cache, out)
-    return out
+class MetadataUpdate:
+    r"""
+    Accumulates the tag updates of the metadata files, so that all of them
+    are applied in a single read-modify-write pass over the files.
+    """
+
+    def __init__(self):
+        self.updates = {}
+
+    def add(self, update, tag):
+        r"""
+        update is a list of (metadata name, new value of tag).
+        """
+        for metadada_name, new_value in update:
+            self.updates.setdefault(metadada_name, {})[tag] = new_value
+        return self
+
+    def apply(self, path_dir_in, path_dir_out, n_workers=16):
+        r"""
+        Reads each updated file in path_dir_in, sets its new tags and saves
+        it in path_dir_out. Files whose content would not change are not
+        rewritten. Returns the number of files written.
+        """
+        tags = sorted({tag for x in self.updates.values() for tag in x})
+        print(f"Updating metadata with tags {', '.join(tags)}")
+        tasks = [(Path(path_dir_in) / name, Path(path_dir_out) / name, x)
+                 for name, x in self.updates.items()]
+
+        bar = progressbar.ProgressBar(maxval=len(tasks))
+        bar.start()
+        n_written = 0
+        with multiprocessing.Pool(processes=n_workers) as pool:
+            for index, written in enumerate(
+                    pool.imap_unordered(_apply_metadata_update, tasks,
+                                        chunksize=64)):
+                bar.update(index)
+                n_written += written
+        bar.finish()
+        print(f"{n_written} files updated, "
+              f"{len(tasks) - n_written} unchanged")
+        return n_written
+
+
+def get_updated_metadata(update, path_dir_in, path_dir_out, tag,
+                         n_workers=16):
+    return MetadataUpdate().add(update, tag).apply(path_dir_in, path_dir_out,
+                                                   n_workers=n_workers)
 
 
 def strToHours(inputStr):
@@ -178,107 +186,162 @@ def get_all_speakers(path_dir, list_metadata):
     return outSpeakers
 
 
-def get_speaker_data(path_dir, list_metadata, pathWav):
-    speakerTalk = {}
-    nData = len(list_metadata)
-    multiples = 0
+def get_audio_hours(path_audio):
+    r"""
+    Duration of path_audio in hours, read from its header.
+    """
+    try:
+        info = sf.info(path_audio)
+        return info.frames / (info.samplerate * 3600.)
+    except RuntimeError:
+        info = torchaudio_legacy_info(path_audio)[0]
+        return info.length / (info.rate * 3600.)
 
-    bar = progressbar.ProgressBar(maxval=nData)
-    bar.start()
-    for nM, metadataName in enumerate(list_metadata):
 
-        bar.update(nM)
-        zipName = get_zip_name(metadataName)
-        wavName = zipName.replace("64kb_mp3.zip", "wav")
-        speakerData = getJSON(os.path.join(path_dir,
-                                           get_speaker_data_name(metadataName)))
+def _scan_audio_file(task):
+    pathMetadata, audio_extension = task
+    out = []
+    # A json per audio file, or the .jsonl of a whole book
+    for path_json, locMetadata in corpus_table.read_records(pathMetadata):
+        speaker_name = locMetadata['speaker']
+        if speaker_name is None:
+            speaker_name = 'null'
+        path_audio_data = os.path.splitext(path_json)[0] + audio_extension
+        out.append((path_json, [speaker_name], locMetadata['book_meta'],
+                    get_audio_hours(path_audio_data)))
+    return out
 
-        dirWav = os.path.join(pathWav, wavName)
-        if not os.path.isdir(dirWav):
-            continue
 
-        listWav = [f'{f}.wav' for f in speakerData["names"]]
+def _scan_book_chapters(task):
+    path_dir, metadataName, pathWav = task
+    zipName = get_zip_name(metadataName)
+    wavName = zipName.replace("64kb_mp3.zip", "wav")
+    speakerData = getJSON(os.path.join(path_dir,
+                                       get_speaker_data_name(metadataName)))
 
-        for index, wavFile in enumerate(listWav):
+    dirWav = os.path.join(pathWav, wavName)
+    if not os.path.isdir(dirWav) or speakerData["names"] is None:
+        return []
 
-            locPath = os.path.join(dirWav, wavFile)
-            if not os.path.isfile(locPath):
-                continue
+    out = []
+    for index, name in enumerate(speakerData["names"]):
+        locPath = os.path.join(dirWav, f'{name}.wav')
+        if not os.path.isfile(locPath):
+            continue
+        speakers = speakerData['readers'][index]
+        if speakers is None:
+            speakers = ['null']
+        out.append((metadataName, speakers, {}, get_audio_hours(locPath)))
+    return out
 
-            info = torchaudio_legacy_info(locPath)
-            size = (info[0].length / info[0].rate) / 3600
 
-            speakers = speakerData['readers'][index]
+def _run_scan(scan_function, tasks, n_workers):
+    r"""
+    Runs scan_function on all tasks with a pool of n_workers processes and
+    returns the concatenation of the rows it outputs.
+    """
+    print(f"Scanning {len(tasks)} metadata files")
+    rows = []
+    bar = progressbar.ProgressBar(maxval=len(tasks))
+    bar.start()
+    with multiprocessing.Pool(processes=n_workers) as pool:
+        for index, out in enumerate(pool.imap(scan_function, tasks,
+                                              chunksize=16)):
+            bar.update(index)
+            rows += out
+    bar.finish()
+    return rows
 
-            if speakers is None:
-                speakers = ['null']
 
-            if len(speakers) > 1:
-                multiples += size
+def _scan_audio_data(list_metadata, audio_extension, n_workers=16):
+    tasks = [(x, audio_extension) for x in list_metadata]
+    return _run_scan(_scan_audio_file, tasks, n_workers)
 
-            for IDspeaker in speakers:
-                if IDspeaker not in speakerTalk:
-                    speakerTalk[IDspeaker] = 0
 
-                speakerTalk[IDspeaker] += size
+def _scan_book_chapters_data(path_dir, list_metadata, pathWav, n_workers=16):
+    tasks = [(path_dir, x, pathWav) for x in list_metadata]
+    return _run_scan(_scan_book_chapters, tasks, n_workers)
 
-    bar.finish()
-    return speakerTalk, multiples
 
+def scan_audio_data(list_metadata, audio_extension, dir_cache=None,
+                    n_workers=16):
+    r"""
+    Reads, once for all, the metadata json of each audio file and the
+    duration of the audio file itself. list_metadata may also contain the
+    .jsonl files written by puts_json.py --jsonl.
+    Returns a list of (metadata path, speakers, book metadata, hours).
+
+    If dir_cache is given, the scan is cached there with data_cache, and
+    done again as soon as one of the files it reads changes: the statistics
+    computed with the same dir_cache share a single scan.
+    """
+    args = (list_metadata, audio_extension)
+    if dir_cache is None:
+        return _scan_audio_data(*args, n_workers=n_workers)
+    # The audio files of a .jsonl are the ones of its directory
+    inputs = [os.path.dirname(x) if x.endswith('.jsonl')
+              else os.path.splitext(x)[0] + audio_extension
+              for x in list_metadata]
+    inputs += list_metadata
+    return data_cache.cached(dir_cache, _scan_audio_data, args=args,
+                             inputs=inputs, kwargs={'n_workers': n_workers})
+
+
+def scan_book_chapters(path_dir, list_metadata, pathWav, dir_cache=None,
+                       n_workers=16):
+    r"""
+    Same as scan_audio_data, for the books freshly downloaded from
+    LibriVox: one row per chapter found in pathWav, the speakers being the
+    readers of the chapter.
+    """
+    args = (path_dir, list_metadata, pathWav)
+    if dir_cache is None:
+        return _scan_book_chapters_data(*args, n_workers=n_workers)
+    inputs = [os.path.join(path_dir, get_speaker_data_name(x))
+              for x in list_metadata] + [pathWav]
+    return data_cache.cached(dir_cache, _scan_book_chapters_data, args=args,
+                             inputs=inputs, kwargs={'n_workers': n_workers})
 
-def get_speaker_hours_data(list_metadata, audio_extension):
 
+def get_speaker_data(path_dir, list_metadata, pathWav, dir_cache=None,
+                     n_workers=16):
     speakerTalk = {}
-    nData = len(list_metadata)
-
-    bar = progressbar.ProgressBar(maxval=nData)
-    bar.start()
-
-    for index, pathMetadata in enumerate(list_metadata):
-        bar.update(index)
-        with open(pathMetadata, 'rb') as file:
-            locMetadata = json.load(file)
-
-        speaker_name = locMetadata['speaker']
+    multiples = 0
 
-        path_audio_data = os.path.splitext(pathMetadata)[0] + audio_extension
+    for _, speakers, _, size in scan_book_chapters(path_dir, list_metadata,
+                                                   pathWav, dir_cache,
+                                                   n_workers):
+        if len(speakers) > 1:
+            multiples += size
 
-        info = torchaudio_legacy_info(path_audio_data)[0]
-        totAudio = info.length / (info.rate * 3600.)
+        for IDspeaker in speakers:
+            speakerTalk[IDspeaker] = speakerTalk.get(IDspeaker, 0) + size
 
-        if speaker_name is None:
-            speaker_name = 'null'
+    return speakerTalk, multiples
 
-        if speaker_name not in speakerTalk:
-            speakerTalk[speaker_name] = 0
 
-        speakerTalk[speaker_name] += totAudio
+def get_speaker_hours_data(list_metadata, audio_extension, dir_cache=None,
+                           n_workers=16):
 
-    bar.finish()
+    speakerTalk = {}
+    for _, speakers, _, totAudio in scan_audio_data(list_metadata,
+                                                    audio_extension,
+                                                    dir_cache, n_workers):
+        for speaker_name in speakers:
+            speakerTalk[speaker_name] = \
+                speakerTalk.get(speaker_name, 0) + totAudio
 
     return speakerTalk
 
 
 def get_hour_tag_repartition(list_metadata, tagName,
-                             audio_extension):
+                             audio_extension, dir_cache=None, n_workers=16):
 
-    nItems = len(list_metadata)
     tags = {}
-
-    bar = progressbar.ProgressBar(maxval=nItems)
-    bar.start()
-
-    for index, pathMetadata in enumerate(list_metadata):
-        bar.update(index)
-        with open(pathMetadata, 'rb') as file:
-            locMetadata = json.load(file)
-
-        value = locMetadata['book_meta'][tagName]
-
-        path_audio_data = os.path.splitext(pathMetadata)[0] + audio_extension
-
-        info = torchaudio_legacy_info(path_audio_data)[0]
-        totAudio = info.length / (info.rate * 3600.)
+    for _, _, book_meta, totAudio in scan_audio_data(list_metadata,
+                                                     audio_extension,
+                                                     dir_cache, n_workers):
+        value = book_meta[tagName]
 
         if value is None:
             value = 'null'
@@ -287,13 +350,8 @@ def get_hour_tag_repartition(list_metadata, tagName,
             value = [value]
 
         full_tag = '+'.join(value)
+        tags[full_tag] = tags.get(full_tag, 0) + totAudio
 
-        if full_tag not in tags:
-            tags[full_tag] = 0
-
-        tags[full_tag] += totAudio
-
-    bar.finish()
     return tags
 
 
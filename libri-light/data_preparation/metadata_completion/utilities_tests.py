@@ -0,0 +1,118 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import soundfile as sf
+import metadata_completion.utilities as ut
+
+
+def write_audio(path, seconds):
+    sf.write(str(path), np.zeros(16000 * seconds), samplerate=16000)
+
+
+class TestScanAudioData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        root = Path(self.tmp_dir.name)
+        self.dir_cache = root / '.cache'
+
+        # Per-file jsons
+        (root / 'book_a').mkdir()
+        for name, speaker, seconds in [('a1', '1', 1), ('a2', '2', 2)]:
+            write_audio(root / 'book_a' / f'{name}.flac', seconds)
+            with open(root / 'book_a' / f'{name}.json', 'w') as file:
+                json.dump({'speaker': speaker,
+                           'book_meta': {'meta_genre': 'Poetry'}}, file)
+
+        # A .jsonl for the whole book, as written by puts_json.py --jsonl
+        (root / 'book_b').mkdir()
+        write_audio(root / 'book_b' / 'b1.flac', 3)
+        with open(root / 'book_b' / 'book_b.jsonl', 'w') as file:
+            file.write(json.dumps(
+                {'file': 'b1', 'speaker': '1',
+                 'book_meta': {'meta_genre': ['Fiction', 'Poetry']}}) + '\n')
+
+        self.root = root
+        self.list_metadata = ut.get_all_metadata(str(root),
+                                                 ('.json', '.jsonl'))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_stats(self):
+        speakers = ut.get_speaker_hours_data(self.list_metadata, '.flac',
+                                             dir_cache=self.dir_cache,
+                                             n_workers=2)
+        tags = ut.get_hour_tag_repartition(self.list_metadata, 'meta_genre',
+                                           '.flac', dir_cache=self.dir_cache,
+                                           n_workers=2)
+        return ({x: round(y * 3600, 3) for x, y in speakers.items()},
+                {x: round(y * 3600, 3) for x, y in tags.items()})
+
+    def test_stats(self):
+        self.assertEqual(len(self.list_metadata), 3)
+        speakers, tags = self.get_stats()
+        self.assertEqual(speakers, {'1': 4, '2': 2})
+        self.assertEqual(tags, {'Poetry': 3, 'Fiction+Poetry': 3})
+
+    def test_single_scan(self):
+        stats = self.get_stats()
+        self.assertEqual(len(list(self.dir_cache.glob('_scan_audio_data-*'))),
+                         1)
+
+        # Both statistics are read from the cached scan
+        with mock.patch.object(ut, '_run_scan',
+                               side_effect=AssertionError('new scan')):
+            self.assertEqual(self.get_stats(), stats)
+
+        # ... until an audio file changes
+        write_audio(self.root / 'book_b' / 'b1.flac', 5)
+        speakers, tags = self.get_stats()
+        self.assertEqual(speakers, {'1': 6, '2': 2})
+        self.assertEqual(tags, {'Poetry': 3, 'Fiction+Poetry': 5})
+
+
+class TestScanBookChapters(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path_dir = Path(self.tmp_dir.name) / 'metadata'
+        self.path_wav = Path(self.tmp_dir.name) / 'wav'
+        self.dir_cache = Path(self.tmp_dir.name) / 'cache'
+        self.path_dir.mkdir()
+        (self.path_wav / 'book_wav').mkdir(parents=True)
+
+        self.list_metadata = ['book_64kb_mp3_metadata.json']
+        with open(self.path_dir / 'book_64kb_mp3_speaker_data.json',
+                  'w') as file:
+            json.dump({'names': ['c1', 'c2', 'c3'],
+                       'readers': [['1'], ['1', '2'], None]}, file)
+        for name, seconds in [('c1', 1), ('c2', 2), ('c3', 4)]:
+            write_audio(self.path_wav / 'book_wav' / f'{name}.wav', seconds)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_speaker_data(self):
+        for _ in range(2):
+            speakers, multiples = ut.get_speaker_data(
+                str(self.path_dir), self.list_metadata, str(self.path_wav),
+                dir_cache=self.dir_cache, n_workers=2)
+            self.assertEqual({x: round(y * 3600, 3)
+                              for x, y in speakers.items()},
+                             {'1': 3, '2': 2, 'null': 4})
+            self.assertEqual(round(multiples * 3600, 3), 2)
+        self.assertEqual(
+            len(list(self.dir_cache.glob('_scan_book_chapters_data-*'))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
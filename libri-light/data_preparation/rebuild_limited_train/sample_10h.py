@@ -1,5 +1,5 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
-from utils import get_histogram, get_speakers, traverse_tree, full_records, print_stats, materialize
+from utils import get_histogram, get_speakers, traverse_tree, full_records, print_stats, materialize, subset_sum
 import argparse
 import pathlib
 import random
@@ -7,26 +7,20 @@ import random
 
 def do_split_10h(records, speakers, max_seconds_per_speaker, min_seconds_per_speaker, total_seconds):
     """
-    Greedily selecting speakers, provided we don't go over budget
+    Selects whole speakers having between min_seconds_per_speaker and
+    max_seconds_per_speaker of speech, such that the total time is as close
+    as possible to total_seconds without going over it
     """
     scaler = 1.0 / 16000  # sampling rate
     speaker2time = get_histogram(records, lambda_key=lambda r: r.speaker.id,
                                  lambda_value=lambda r: r.length * scaler)
 
-    speakers = set([r.speaker.id for r in records])
-    speakers = sorted(speakers)
+    speakers = [s for s in sorted(speaker2time)
+                if min_seconds_per_speaker <= speaker2time[s] <= max_seconds_per_speaker]
     random.shuffle(speakers)
 
-    time_taken = 0.0
-    speakers_taken = []
-
-    for speaker in speakers:
-        current_speaker_time = speaker2time[speaker]
-        if min_seconds_per_speaker <= current_speaker_time <= max_seconds_per_speaker and current_speaker_time < total_seconds - time_taken:
-            speakers_taken.append(speaker)
-            time_taken += current_speaker_time
-
-    speakers_taken = set(speakers_taken)
+    selected = subset_sum([speaker2time[s] for s in speakers], total_seconds)
+    speakers_taken = set(speakers[i] for i in selected)
 
     records_filtered = [r for r in records if r.speaker.id in speakers_taken]
     return records_filtered
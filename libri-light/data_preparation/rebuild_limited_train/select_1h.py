@@ -1,25 +1,26 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
-from utils import get_histogram, get_speakers, traverse_tree, full_records, print_stats, materialize
+from utils import get_histogram, get_speakers, traverse_tree, full_records, print_stats, materialize, group_by_speaker, subset_sum
 import argparse
 import pathlib
 import random
 
 
 def do_split(records, seconds_per_speaker):
-    speakers = list(set([r.speaker.id for r in records]))
+    """
+    For each speaker, selects the utterances whose total time is as close
+    as possible to seconds_per_speaker without going over it
+    """
+    speaker2records = group_by_speaker(records)
+    speakers = sorted(speaker2records)
     random.shuffle(speakers)
     records_filtered = []
 
     for speaker in speakers:
-        time_taken = 0
-        speaker_records = [r for r in records if r.speaker.id == speaker]
-
-        for r in speaker_records:
-            if time_taken > seconds_per_speaker * 16000:
-                break
-            time_taken += r.length
-
-            records_filtered.append(r)
+        speaker_records = speaker2records[speaker]
+        random.shuffle(speaker_records)
+        selected = subset_sum([r.length / 16000 for r in speaker_records],
+                              seconds_per_speaker)
+        records_filtered.extend(speaker_records[i] for i in selected)
 
     return records_filtered
 
@@ -1,10 +1,21 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 import pathlib
 from collections import namedtuple
-import torchaudio
+import soundfile as sf
 import shutil
+import os
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import tqdm
 
 
+# Lengths of the audio files, shared by all the scripts and all the roots
+LENGTHS_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'librilight',
+                             'flac_lengths.json')
+
 Speaker = namedtuple('Speaker', ['id', 'gender', 'subset'])
 FileRecord = namedtuple(
     'FileRecord', ['fname', 'length', 'speaker', 'book', 'text_file'])
@@ -30,20 +41,56 @@ def get_speakers(speaker_path):
 
 
 def get_filelength(fname):
-    info = torchaudio.info(fname)[0]
-    return info.length
-
-
-def traverse_tree(root, ext='flac'):
+    r"""
+    Number of samples of an audio file. For flac files, it is read from the
+    STREAMINFO block, which the format requires to come first.
+    """
+    with open(fname, 'rb') as f:
+        header = f.read(42)
+    if header[:4] == b'fLaC' and header[4] & 0x7f == 0:
+        # STREAMINFO bytes 10-17: sample rate (20 bits), channels (3),
+        # bits per sample (5), total samples (36)
+        total_samples = int.from_bytes(header[18:26], 'big') & (2**36 - 1)
+        if total_samples > 0:
+            return total_samples
+    return sf.info(fname).frames
+
+
+def _get_cached_filelength(task):
+    fname, cached = task
+    stat = os.stat(fname)
+    key = [stat.st_size, stat.st_mtime_ns]
+    if cached is not None and cached[:2] == key:
+        return key + cached[2:]
+    return key + [get_filelength(fname)]
+
+
+def traverse_tree(root, ext='flac', cache_path=LENGTHS_CACHE, n_threads=32):
     fnames = pathlib.Path(root).rglob(f"*.{ext}")
     fnames = sorted(list(fnames))
 
-    lengths = []
-    for file in fnames:
-        file = str(file.resolve())
-        length = get_filelength(file)
-        lengths.append(length)
+    cache = {}
+    if cache_path is not None and os.path.isfile(cache_path):
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+
+    full_names = [str(file.resolve()) for file in fnames]
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        entries = list(pool.map(_get_cached_filelength,
+                                [(x, cache.get(x)) for x in full_names]))
 
+    n_read = sum(cache.get(x) != entry
+                 for x, entry in zip(full_names, entries))
+    print(f'{len(fnames)} files, {n_read} lengths read from the audio')
+
+    if cache_path is not None and n_read > 0:
+        cache.update(zip(full_names, entries))
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path + '.tmp', 'w') as f:
+            json.dump(cache, f)
+        os.replace(cache_path + '.tmp', cache_path)
+
+    lengths = [entry[2] for entry in entries]
     return list(zip(fnames, lengths))
 
 
@@ -88,10 +135,87 @@ def get_histogram(records, lambda_key, lambda_value):
     return key_value
 
 
-def materialize(records, target_dir, tag=None, move=False):
+def group_by_speaker(records):
+    speaker2records = {}
+    for record in records:
+        speaker2records.setdefault(record.speaker.id, []).append(record)
+    return speaker2records
+
+
+def subset_sum(weights, capacity, resolution=0.1):
+    r"""
+    Selects a subset of weights (in seconds) with the largest sum not above
+    capacity, i.e. solves the knapsack problem where each item is worth its
+    weight. Weights are rounded up to multiples of resolution and the
+    problem is solved exactly by dynamic programming over the reachable
+    sums, so the returned subset never exceeds capacity and is optimal up
+    to the discretization. When several subsets are optimal, the one
+    returned depends on the order of weights.
+
+    Returns the list of the selected indices.
+    """
+    int_capacity = int(math.floor(capacity / resolution + 1e-9))
+    int_weights = [int(math.ceil(w / resolution - 1e-9)) for w in weights]
+
+    reachable = np.zeros(int_capacity + 1, dtype=bool)
+    reachable[0] = True
+    # item that made each sum reachable first, to backtrack the solution
+    reached_by = np.full(int_capacity + 1, -1, dtype=np.int64)
+
+    for index, w in enumerate(int_weights):
+        if w > int_capacity or w == 0:
+            continue
+        new_sums = np.zeros_like(reachable)
+        new_sums[w:] = reachable[:-w] & ~reachable[w:]
+        reached_by[new_sums] = index
+        reachable |= new_sums
+
+    selected = []
+    total = np.flatnonzero(reachable)[-1]
+    while total > 0:
+        index = reached_by[total]
+        selected.append(int(index))
+        total -= int_weights[index]
+
+    # zero-length items are free
+    selected += [i for i, w in enumerate(int_weights) if w == 0]
+    return sorted(selected)
+
+
+def _materialize_file(task):
+    r"""
+    Hard-links src to dst if link (unless dst exists; copies it when both
+    are on different filesystems), copies it otherwise. Returns the number
+    of bytes materialized.
+    """
+    src, dst, link = task
+    if link:
+        if dst.exists():
+            return 0
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy(src, dst)
+    else:
+        shutil.copy(src, dst)
+    return os.path.getsize(dst)
+
+
+def materialize(records, target_dir, tag=None, move=False, n_threads=16):
+    r"""
+    Places the audio and text files of records in
+    target_dir / [tag] / speaker / book.
+
+    Unless move, the audio files are hard-linked when possible: they then
+    share their content with the source files, and an in-place rewrite of
+    any of them would change all the splits. Files must only be replaced
+    (written to a temporary file, then os.replace). The texts, edited in
+    place by clean_texts.py, are always copied.
+    """
     target_dir = pathlib.Path(target_dir)
 
     to_copy = set()
+    to_link = set()
     to_move = set()
 
     for record in records:
@@ -106,21 +230,33 @@ def materialize(records, target_dir, tag=None, move=False):
         target_book_dir.mkdir(exist_ok=True, parents=True)
 
         if not move:
-            to_copy.add((record.fname, target_book_dir / record.fname.name))
+            to_link.add((record.fname, target_book_dir / record.fname.name))
         else:
             to_move.add((record.fname, target_book_dir / record.fname.name))
 
+        # texts are edited in place by clean_texts.py: never hard-link them
         to_copy.add((record.text_file, target_book_dir / record.text_file.name))
 
-    to_copy = sorted(list(to_copy))
-    for src, dst in to_copy:
-        shutil.copy(src, dst)
+    start_time = time.time()
+    n_bytes = 0
+    tasks = [(src, dst, True) for src, dst in sorted(to_link)] + \
+        [(src, dst, False) for src, dst in sorted(to_copy)]
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        for file_bytes in tqdm.tqdm(pool.map(_materialize_file, tasks),
+                                    total=len(tasks)):
+            n_bytes += file_bytes
 
     if len(to_move) > 0:
         to_move = sorted(list(to_move))
         for src, dst in to_move:
+            n_bytes += os.path.getsize(src)
             shutil.move(src, dst)
 
+    elapsed = time.time() - start_time
+    print(f'{len(tasks) + len(to_move)} files, {n_bytes / 2**30:.2f} GB '
+          f'materialized in {elapsed:.1f}s '
+          f'({n_bytes / 2**20 / max(elapsed, 1e-6):.1f} MB/s)')
+
 
 def print_stats(records):
     def lambda_speaker(r): return r.speaker.id
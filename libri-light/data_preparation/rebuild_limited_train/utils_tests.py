@@ -0,0 +1,114 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import itertools
+import os
+import pathlib
+import tempfile
+import unittest
+import numpy as np
+from utils import subset_sum, materialize, FileRecord, Speaker
+
+
+def best_sum(weights, capacity):
+    r"""
+    Largest sum of a subset of weights not above capacity, by brute force.
+    """
+    best = 0
+    for size in range(1, len(weights) + 1):
+        for subset in itertools.combinations(weights, size):
+            if best < sum(subset) <= capacity:
+                best = sum(subset)
+    return best
+
+
+class TestSubsetSum(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_capacity(self):
+        for _ in range(50):
+            weights = self.rng.uniform(0, 30, size=20).tolist()
+            capacity = self.rng.uniform(0, 200)
+            selected = subset_sum(weights, capacity)
+            self.assertEqual(len(set(selected)), len(selected))
+            self.assertLessEqual(sum(weights[i] for i in selected), capacity)
+
+    def test_brute_force(self):
+        resolution = 0.1
+        for _ in range(30):
+            n = int(self.rng.integers(1, 11))
+            capacity = self.rng.uniform(0, 50)
+
+            # Multiples of the resolution: no discretization error
+            weights = (self.rng.integers(1, 200, size=n) * resolution).tolist()
+            selected = subset_sum(weights, capacity, resolution=resolution)
+            self.assertAlmostEqual(sum(weights[i] for i in selected),
+                                   best_sum(weights, capacity))
+
+            # Each weight is rounded up by less than the resolution: any
+            # subset fitting in capacity - n * resolution still fits after
+            # rounding, and the optimum of the rounded weights is at most
+            # n * resolution from its actual sum
+            weights = self.rng.uniform(0, 20, size=n).tolist()
+            selected = subset_sum(weights, capacity, resolution=resolution)
+            total = sum(weights[i] for i in selected)
+            self.assertLessEqual(total, best_sum(weights, capacity) + 1e-9)
+            self.assertGreaterEqual(total, best_sum(weights, capacity
+                                                    - n * resolution)
+                                    - n * resolution)
+
+    def test_empty_and_over_capacity(self):
+        self.assertEqual(subset_sum([], 10), [])
+        self.assertEqual(subset_sum([5, 3], 0), [])
+        self.assertEqual(subset_sum([11, 12.5], 10), [])
+        self.assertEqual(subset_sum([11, 4, 12.5, 6], 10), [1, 3])
+        # Everything fits
+        self.assertEqual(subset_sum([1, 2, 3], 100), [0, 1, 2])
+
+
+class TestMaterialize(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmp_dir.name)
+        src = self.root / 'src'
+        src.mkdir()
+        text_file = src / '19-198.trans.txt'
+        text_file.write_text('19-198-0000 A\n19-198-0001 B\n')
+        self.records = []
+        for index in range(2):
+            fname = src / f'19-198-000{index}.flac'
+            fname.write_bytes(bytes(10 + index))
+            self.records.append(FileRecord(
+                fname=fname, length=10, book=198, text_file=text_file,
+                speaker=Speaker(id=19, gender='F', subset='train-clean-100')))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_link_and_copy(self):
+        materialize(self.records, self.root / 'dst', tag='clean')
+        # twice: the existing files are kept
+        materialize(self.records, self.root / 'dst', tag='clean')
+        dst = self.root / 'dst' / 'clean' / '19' / '198'
+        self.assertEqual(sorted(x.name for x in dst.iterdir()),
+                         ['19-198-0000.flac', '19-198-0001.flac',
+                          '19-198.trans.txt'])
+        for record in self.records:
+            self.assertTrue(os.path.samefile(record.fname,
+                                             dst / record.fname.name))
+        self.assertFalse(os.path.samefile(self.records[0].text_file,
+                                          dst / '19-198.trans.txt'))
+
+    def test_move(self):
+        materialize(self.records, self.root / 'dst', move=True)
+        dst = self.root / 'dst' / '19' / '198'
+        self.assertEqual(len(list(dst.glob('*.flac'))), 2)
+        self.assertFalse(self.records[0].fname.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,35 +1,117 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 import argparse
+import functools
 import json
 import pathlib
 import shutil
 import os
 import multiprocessing
+import sys
+import time
+import tqdm
+
+
+def link_or_copy(src, dst):
+    r"""
+    Hard-links src to dst when both are on the same filesystem, copies it
+    otherwise. Returns the number of bytes materialized.
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+    return os.path.getsize(dst)
+
+
+def copy(src, dst):
+    shutil.copy(src, dst)
+    return os.path.getsize(dst)
+
+
+# lambda-functions are un-pickable
+def _print(src, dst):
+    print(src, '->', dst)
+    return 0
+
+
+ACTIONS = {'link': link_or_copy, 'copy': copy, 'print': _print}
+
+
+@functools.lru_cache(maxsize=16)
+def _read_jsonl(path_jsonl):
+    records = {}
+    with open(path_jsonl, 'r') as f:
+        for line in f:
+            data = json.loads(line)
+            records[data.pop('file')] = data
+    return records
+
+
+def read_meta(path_json):
+    r"""
+    Meta-data of an audio file, read from its json or, when the corpus was
+    written by puts_json.py --jsonl, from the .jsonl file of its book.
+    Returns None if neither exists.
+    """
+    path_json = pathlib.Path(path_json)
+    if path_json.exists():
+        with open(path_json, 'r') as f:
+            return json.loads(f.read())
+    path_jsonl = path_json.parent / (path_json.parent.name + '.jsonl')
+    if not path_jsonl.exists():
+        return None
+    return _read_jsonl(str(path_jsonl)).get(path_json.stem)
+
+
+def write_json(meta, dst, mode):
+    r"""
+    Writes the per-file json of meta at dst, the released splits having one
+    json per flac whatever the layout of the source corpus.
+    """
+    if mode == 'print':
+        print('<jsonl record>', '->', dst)
+        return 0
+    with open(dst, 'w') as f:
+        f.write(json.dumps(meta, indent=1))
+    return os.path.getsize(dst)
 
 
 def _apply(task):
-    file, args, action = task
+    file, speaker, args = task
+    action = ACTIONS[args.mode]
 
     src = pathlib.Path(args.src_dir)
     dst = pathlib.Path(args.dst_dir)
 
     file = pathlib.Path(file)
-    with open(file, 'r') as f:
-        meta = json.loads(f.read())
+    if speaker is None:
+        meta = read_meta(file)
+        if meta is None:
+            return 0, [str(file)]
         speaker = meta['speaker']
 
     dst_dir = dst / speaker / file.parent.name
-    dst_dir.mkdir(exist_ok=True, parents=True)
-
-    # move/copy json file
-    src_file = src / file.parent.name / file.name
-    dst_file = dst_dir / file.name
-    action(src_file, dst_file)
-
-    # move/copy flac file
-    src_file = src / file.parent.name / (file.stem + '.flac')
-    dst_file = dst_dir / (file.stem + '.flac')
-    action(src_file, dst_file)
+    if args.mode != 'print':
+        dst_dir.mkdir(exist_ok=True, parents=True)
+
+    n_bytes = 0
+    missing = []
+    # move/copy json and flac files, unless they are already there
+    for name in [file.name, file.stem + '.flac']:
+        src_file = src / file.parent.name / name
+        dst_file = dst_dir / name
+        if dst_file.exists():
+            continue
+        if src_file.exists():
+            n_bytes += action(src_file, dst_file)
+            continue
+        # without a json, the meta-data may be in the .jsonl of the book
+        meta = read_meta(src_file) if name == file.name else None
+        if meta is None:
+            missing.append(str(src_file))
+            continue
+        n_bytes += write_json(meta, dst_file, args.mode)
+    return n_bytes, missing
 
 
 def get_args():
@@ -41,7 +123,9 @@ def get_args():
     parser.add_argument('--minus', type=str, action='append', default=[])
     parser.add_argument('--n_workers', type=int, default=16)
     parser.add_argument('--mode', type=str,
-                        choices=['copy', 'print'], default='print')
+                        choices=['link', 'copy', 'print'], default='print',
+                        help="link: hard-link the files, or copy them if "
+                        "src_dir and dst_dir are on different filesystems")
 
     args = parser.parse_args()
 
@@ -50,16 +134,15 @@ def get_args():
     return args
 
 
-# lambda-functions are un-pickable
-def _print(src, dst):
-    print(src, '->', dst)
-
-
 if __name__ == '__main__':
     args = get_args()
 
     with open(args.json, 'r') as f:
-        files = json.loads(f.read())['files']
+        split = json.loads(f.read())
+    files = split['files']
+    # Splits made before speakers were stored in them: read the speaker from
+    # the json of each file
+    speakers = split.get('speakers', [None] * len(files))
 
     files_minus = []
     for fname in args.minus:
@@ -68,12 +151,24 @@ if __name__ == '__main__':
 
     files_minus = set(files_minus)
 
-    if args.mode == 'copy':
-        action = shutil.copy
-    elif args.mode == 'print':
-        action = _print
-
-    tasks = [(file, args, action) for file in files if file not in files_minus]
+    tasks = [(file, speaker, args) for file, speaker in zip(files, speakers)
+             if file not in files_minus]
 
+    start_time = time.time()
+    n_bytes = 0
+    missing = []
     with multiprocessing.Pool(processes=args.n_workers) as pool:
-        pool.map(_apply, tasks)
+        for file_bytes, file_missing in \
+                tqdm.tqdm(pool.imap_unordered(_apply, tasks, chunksize=64),
+                          total=len(tasks)):
+            n_bytes += file_bytes
+            missing += file_missing
+    elapsed = time.time() - start_time
+    print(f'{len(tasks)} files, {n_bytes / 2**30:.2f} GB materialized in '
+          f'{elapsed:.1f}s ({n_bytes / 2**20 / max(elapsed, 1e-6):.1f} MB/s)')
+
+    if missing:
+        for path in sorted(missing)[:20]:
+            print(f'Missing source file: {path}', file=sys.stderr)
+        sys.exit(f'{len(missing)} source files are missing, '
+                 f'the split in {args.dst_dir} is incomplete')
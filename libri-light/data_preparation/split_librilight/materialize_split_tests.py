@@ -0,0 +1,112 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+
+DIR_SCRIPTS = pathlib.Path(__file__).resolve().parent
+sys.path.append(str(DIR_SCRIPTS.parent))
+from calculate_snr import SNRStore  # noqa: E402
+
+
+def run_script(name, cwd, *args):
+    subprocess.run([sys.executable, str(DIR_SCRIPTS / name)] + list(args),
+                   cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+
+
+class TestJsonlPipeline(unittest.TestCase):
+    r"""
+    puts_json.py --jsonl, then split.py, then materialize_split.py on a tiny
+    corpus of 3 books.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmp_dir.name)
+        librivox_dir = self.root / 'librivox'
+        self.processed = self.root / 'processed'
+        librivox_dir.mkdir()
+
+        vads = {}
+        snr_store = SNRStore(str(self.root / 'vad_based_snr_all.db'))
+        for book in range(3):
+            name = f'book{book}_{1000 + book}'
+            chapters = [f'chapter{x}_{name}' for x in range(4)]
+            meta = {'id': str(1000 + book), 'genre': [f'genre{book % 2}'],
+                    'meta_genre': 'Literature', 'title': name}
+            speaker_data = {'names': chapters,
+                            'readers': [[str(10 * book + x % 2)]
+                                        for x in range(4)]}
+            path_meta = librivox_dir / f'{name}_librivox_64kb_mp3_metadata.json'
+            path_meta.write_text(json.dumps(meta))
+            (librivox_dir / f'{name}_librivox_64kb_mp3_speaker_data.json') \
+                .write_text(json.dumps(speaker_data))
+
+            (self.processed / name).mkdir(parents=True)
+            for index, chapter in enumerate(chapters):
+                (self.processed / name / f'{chapter}_64kb.flac') \
+                    .write_bytes(bytes(100 + index))
+                vads[f'{name}/{chapter}.vad'] = [[[0, 50]], 100 + 25 * index]
+                snr_store.put(f'/wav/{name}_librivox_wav/{chapter}.wav', 0.0,
+                              [10.0 + index, 1.0, 0.1])
+        snr_store.close()
+
+        (self.root / 'vads.json').write_text(json.dumps(vads))
+        (self.root / 'test_speakers.json').write_text(
+            json.dumps({'test_speakers': [21]}))
+        (self.root / 'title_duplicates.json').write_text(json.dumps([]))
+
+        run_script('puts_json.py', self.root, '--jsonl', '--n_workers', '2',
+                   '--librivox_dir', str(librivox_dir),
+                   '--librivox_processed', str(self.processed))
+        run_script('split.py', self.root, '--sampling_steps', '2',
+                   '--size_divisor', '2',
+                   '--librivox_processed', str(self.processed))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def materialize(self, path_split):
+        dst_dir = self.root / 'dst'
+        run_script('materialize_split.py', self.root, '--mode', 'copy',
+                   '--n_workers', '2', '--src_dir', str(self.processed),
+                   '--dst_dir', str(dst_dir), '--json', str(path_split))
+
+        with open(path_split, 'r') as f:
+            files = json.load(f)['files']
+        self.assertTrue(files)
+        for file in files:
+            file = pathlib.Path(file)
+            book = file.parent.name
+            with open(self.processed / book / (book + '.jsonl'), 'r') as f:
+                records = [json.loads(line) for line in f]
+            record = [x for x in records if x.pop('file') == file.stem][0]
+
+            dst_book = dst_dir / record['speaker'] / book
+            self.assertTrue((dst_book / (file.stem + '.flac')).is_file())
+            with open(dst_book / file.name, 'r') as f:
+                self.assertEqual(json.load(f), record)
+        self.assertEqual(len(list(dst_dir.rglob('*.json'))), len(files))
+
+    def test_jsonl_layout(self):
+        self.assertFalse(list(self.processed.rglob('*.json')))
+        self.materialize(self.root / 'split_1.json')
+
+    def test_split_without_speakers(self):
+        path_split = self.root / 'split_1.json'
+        with open(path_split, 'r') as f:
+            split = json.load(f)
+        del split['speakers']
+        with open(path_split, 'w') as f:
+            json.dump(split, f)
+        self.materialize(path_split)
+
+
+if __name__ == '__main__':
+    unittest.main()
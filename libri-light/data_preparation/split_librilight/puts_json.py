@@ -3,9 +3,10 @@ from typing import Set
 
 import argparse
 import json
+import os
 import pathlib
-import copy
 import dataclasses
+import multiprocessing
 
 
 @dataclasses.dataclass
@@ -63,60 +64,54 @@ def normalize(name):
     return name
 
 
-def parse_downloaded_jsons(librivox_dir, duplicates=None):
-    name2json = {}
+def _load_book_jsons(meta_fname):
+    with open(meta_fname,  'r') as f:
+        meta_data = json.load(f)
+
+    speaker_fname = meta_fname[:-13] + 'speaker_data.json'
+    with open(speaker_fname,  'r') as f:
+        speaker_data = json.loads(f.read())
+
+    root_name = normalize(pathlib.Path(meta_fname).name)
+    return root_name, dict(meta=meta_data, speaker_data=speaker_data)
+
+
+def parse_downloaded_jsons(librivox_dir, duplicates=None, n_workers=16):
+    fnames = []
     n_duplicates = 0
 
-    fnames = pathlib.Path(librivox_dir).rglob(f"*_metadata.json")
-    for meta_fname in fnames:
+    for meta_fname in pathlib.Path(librivox_dir).rglob(f"*_metadata.json"):
         if duplicates and meta_fname.name in duplicates:
             n_duplicates += 1
             continue
+        fnames.append(str(meta_fname))
 
-        with open(meta_fname,  'r') as f:
-            meta_data = json.load(f)
-
-        speaker_fname = str(meta_fname)[:-13] + 'speaker_data.json'
-        with open(speaker_fname,  'r') as f:
-            speaker_data = json.loads(f.read())
-
-        root_name = str(meta_fname.name)
-        root_name = normalize(root_name)
-
-        name2json[root_name] = dict(meta=meta_data, speaker_data=speaker_data)
+    with multiprocessing.Pool(processes=n_workers) as pool:
+        name2json = dict(pool.imap(_load_book_jsons, fnames, chunksize=64))
     return name2json, n_duplicates
 
 
 def read_snr(fname):
-    import csv
-    name2snr = []
-
-    lineno = 0
-    errors = 0
-    with open(fname, 'r') as f:
-        r = csv.reader(f, delimiter='\t')
-        for row in r:
-            parent_name = pathlib.Path(row[0]).parent.name
-            parent_name = str(parent_name)
-
-            name = pathlib.Path(row[0]).stem
-            name = str(name)
-            snr = float(row[1])
-            name2snr.append(((parent_name, name), snr))
-
+    """
+    Loads the SNR of each file from the sqlite table built by
+    `calculate_snr.py`, as a {normalized dir name: {file stem: snr}} dict.
+    """
+    import sqlite3
     snr_table = {}
 
-    for fname, snr in name2snr:
-        dir_name = normalize(fname[0])
-        fname = fname[1]
-
+    connection = sqlite3.connect(fname)
+    for path, snr in connection.execute("SELECT path, snr FROM snr"):
+        path = pathlib.Path(path)
+        dir_name = normalize(str(path.parent.name))
         if dir_name not in snr_table:
             snr_table[dir_name] = {}
-        snr_table[dir_name][fname] = snr
+        snr_table[dir_name][str(path.stem)] = float(
+            'nan') if snr is None else snr
+    connection.close()
     return snr_table
 
 
-def process_dir(normalized_book_name, dir_name, name2meta, file_times, voice_activities, snr_table, test_speakers, extension='*.flac'):
+def process_dir(normalized_book_name, dir_name, name2meta, file_times, voice_activities, snr_table, test_speakers, extension='*.flac', jsonl=False):
     speaker2file = dict(zip(name2meta[normalized_book_name]['speaker_data']
                             ['names'], name2meta[normalized_book_name]['speaker_data']['readers']))
 
@@ -126,6 +121,11 @@ def process_dir(normalized_book_name, dir_name, name2meta, file_times, voice_act
 
     errors = BookError()
 
+    # The same book meta-data is shared by the records of all the files
+    book_meta = {k: v for k, v in name2meta[normalized_book_name]['meta'].items()
+                 if k not in ['totaltime', 'trancription_status']}
+    records = []
+
     for file_name in dir_name.glob(extension):
         fname = file_name.stem
         assert fname.endswith('_64kb')
@@ -164,30 +164,53 @@ def process_dir(normalized_book_name, dir_name, name2meta, file_times, voice_act
 
         errors.ok += 1
 
-        target = file_name.parent / (file_name.stem + '.json')
-        data = copy.deepcopy(name2meta[normalized_book_name])
-        del data['speaker_data']
+        data = {}
         data['speaker'] = speaker
         data['file_length_sec'] = file_times[normalized_book_name][fname]
-        del data['meta']['totaltime']
-        del data['meta']['trancription_status']
-        meta = data['meta']
-        del data['meta']
-        data['book_meta'] = meta
+        data['book_meta'] = book_meta
 
         assert fname in snr_table[normalized_book_name], (
             fname, normalized_book_name)
         data['snr'] = round(snr_table[normalized_book_name][fname], 4)
         data['voice_activity'] = [(round(x[0], 4), round(x[1], 4))
                                   for x in voice_activities[normalized_book_name][fname]]
-
-        with open(target, 'w') as fout:
-            out = json.dumps(data, indent=1)
-            fout.write(out)
+        records.append((file_name, data))
+
+    # The files are replaced rather than rewritten in place: they may be
+    # hard-linked in the splits materialized by materialize_split.py
+    if jsonl:
+        target = dir_name / (dir_name.name + '.jsonl')
+        with open(str(target) + '.tmp', 'w') as fout:
+            for file_name, data in records:
+                fout.write(json.dumps(dict(file=file_name.stem, **data)))
+                fout.write('\n')
+        os.replace(str(target) + '.tmp', target)
+    else:
+        for file_name, data in records:
+            target = file_name.parent / (file_name.stem + '.json')
+            with open(str(target) + '.tmp', 'w') as fout:
+                fout.write(json.dumps(data, indent=1))
+            os.replace(str(target) + '.tmp', target)
 
     return errors
 
 
+# Read-only tables shared with the worker processes, see _init_worker
+_TABLES = {}
+
+
+def _init_worker(tables):
+    _TABLES.update(tables)
+
+
+def _process_dir(task):
+    normalized_book_name, dir_path, jsonl = task
+    return process_dir(normalized_book_name, dir_path, _TABLES['name2json'],
+                       _TABLES['voice_times'], _TABLES['voice_activities'],
+                       _TABLES['snr_table'], _TABLES['test_speakers'],
+                       jsonl=jsonl)
+
+
 def get_voice_activities(vad_preprocessed, seconds_per_frame=80.0/1000.0):
     file_times = {}
     voice_activities = {}
@@ -236,7 +259,7 @@ def get_args():
     parser.add_argument('--librivox_dir', type=str, required=True)
     parser.add_argument('--vad_preprocessed', type=str, default='vads.json')
     parser.add_argument('--snr_preprocessed', type=str,
-                        default='vad_based_snr_all.tsv')
+                        default='vad_based_snr_all.db')
     parser.add_argument('--librivox_processed', type=str, required=True)
     parser.add_argument('--test_speakers', type=str,
                         default='test_speakers.json')
@@ -244,6 +267,11 @@ def get_args():
                         default='title_duplicates.json')
     parser.add_argument('--millis_per_frame', type=float,
                         default=80.0)
+    parser.add_argument('--n_workers', type=int, default=16)
+    parser.add_argument('--jsonl', action='store_true',
+                        help="Write the meta-data of all the files of a book "
+                        "in a single <book>.jsonl file (one line per file) "
+                        "instead of one json per flac")
 
     args = parser.parse_args()
     return args
@@ -262,7 +290,7 @@ if __name__ == '__main__':
     voice_times, voice_activities = get_voice_activities(
         args.vad_preprocessed, seconds_per_frame=args.millis_per_frame/1000.0)
     name2json, n_duplicates = parse_downloaded_jsons(
-        args.librivox_dir, duplicates_to_remove)
+        args.librivox_dir, duplicates_to_remove, n_workers=args.n_workers)
 
     unmatched_names = set()
 
@@ -273,17 +301,25 @@ if __name__ == '__main__':
 
     aggregated_errors = BookError()
 
+    tasks = []
     for dir_path in dir_paths:
         book_name = str(dir_path.name)
         normalized_book_name = normalize(book_name)
 
         if normalized_book_name in name2json:
-            errors = process_dir(normalized_book_name, dir_path, name2json,
-                                 voice_times, voice_activities, snr_table, test_speakers)
-            aggregated_errors.update(errors)
+            tasks.append((normalized_book_name, dir_path, args.jsonl))
         else:
             unmatched_names.add(book_name)
 
+    tables = dict(name2json=name2json, voice_times=voice_times,
+                  voice_activities=voice_activities, snr_table=snr_table,
+                  test_speakers=set(test_speakers))
+    with multiprocessing.Pool(processes=args.n_workers,
+                              initializer=_init_worker,
+                              initargs=(tables,)) as pool:
+        for errors in pool.imap_unordered(_process_dir, tasks, chunksize=8):
+            aggregated_errors.update(errors)
+
     print('Done, flushing stats...')
     with open('processing_results.json', 'w') as f:
         results = aggregated_errors.as_dict()
@@ -1,152 +1,134 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
-from collections import defaultdict
 import argparse
 import json
 import pathlib
-import math
-
-
-def get_stats(fnames, fnames2jsons):
-
-    total_seconds = sum(fnames2jsons[fname]
-                        ['file_length_sec'] for fname in fnames)
-
-    files_per_genre = defaultdict(int)
-    seconds_per_genre = defaultdict(int)
-    snr_per_genre = defaultdict(float)
-
-    mean_snr = 0.0
-
-    unique_speakers = set()
-    unique_books = set()
-
-    for fname in fnames:
-        data = fnames2jsons[fname]
-
-        snr = data['snr'] if not math.isnan(data['snr']) else 0.0
-        seconds = data['file_length_sec']
-
-        mean_snr += snr * seconds
-
-        if 'genre' not in data['book_meta'] or data['book_meta']['genre'] is None:
-            file_genres = ['<none>']
-        else:
-            file_genres = data['book_meta']['genre']
-
-        for genre in file_genres:
-            files_per_genre[genre] += 1
-            seconds_per_genre[genre] += seconds
-            snr_per_genre[genre] += snr * seconds
-
-        unique_speakers.add(data['speaker'])
-        unique_books.add(data['book_meta']['id'])
-
-    for g in snr_per_genre:
-        snr_per_genre[g] /= seconds_per_genre[g]
-
-    mean_snr /= total_seconds
-    return seconds_per_genre, files_per_genre, snr_per_genre, total_seconds, unique_books, unique_speakers, mean_snr
-
-
-def get_genre2time(fnames, fnames2jsons):
-    seconds_per_genre = defaultdict(int)
-
-    for fname in fnames:
-        data = fnames2jsons[fname]
-        if 'genre' not in data['book_meta'] or data['book_meta']['genre'] is None:
-            file_genres = ['<none>']
-        else:
-            file_genres = data['book_meta']['genre']
-
-        for genre in file_genres:
-            seconds_per_genre[genre] += data['file_length_sec']
-
-    return seconds_per_genre
-
-
-def get_genre2files(fnames, fnames2jsons):
-    genre_files = defaultdict(list)
-
-    for fname in fnames:
-        data = fnames2jsons[fname]
-        if 'genre' not in data['book_meta'] or data['book_meta']['genre'] is None:
-            file_genres = ['<none>']
-        else:
-            file_genres = data['book_meta']['genre']
-
-        for genre in file_genres:
-            genre_files[genre].append(fname)
-
-    return genre_files
-
-
-def get_fname2json(fnames):
-    fname2json = {}
-    for fname in fnames:
-        with open(fname, 'r') as f:
-            data = json.load(f)
-        fname2json[fname] = data
-    return fname2json
-
-
-def subselect(fnames, files2jsons, divisor=10):
-    overall_time = sum(
-        fnames2jsons[fname]['file_length_sec'] for fname in fnames)
+import sys
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+from corpus_table import cached_compile_dir  # noqa: E402
+
+
+def get_stats(indices, table, incidence):
+    r"""
+    Statistics of the files indices of the table. incidence is the
+    n_files x n_genres genre incidence matrix of the table.
+    """
+    seconds = table.file_length_sec[indices]
+    snr = np.nan_to_num(table.snr[indices], nan=0.0)
+    file_incidence = incidence[indices]
+
+    total_seconds = seconds.sum()
+    files_per_genre = file_incidence.sum(axis=0)
+    genre_seconds = seconds @ file_incidence
+    genre_snr = (snr * seconds) @ file_incidence
+
+    seconds_per_genre, snr_per_genre, files_per_genre_dict = {}, {}, {}
+    for g in np.flatnonzero(files_per_genre):
+        genre = str(table.genres[g])
+        files_per_genre_dict[genre] = int(files_per_genre[g])
+        seconds_per_genre[genre] = float(genre_seconds[g])
+        snr_per_genre[genre] = float(genre_snr[g] / genre_seconds[g])
+
+    unique_speakers = np.unique(table.speaker[indices])
+    unique_books = np.unique(table.book[indices])
+
+    mean_snr = float((snr * seconds).sum() / total_seconds)
+    return seconds_per_genre, files_per_genre_dict, snr_per_genre, float(total_seconds), unique_books, unique_speakers, mean_snr
+
+
+def fit_prefixes(lengths, rows, cols, budgets, n_rows):
+    r"""
+    rows, cols are the non-zero entries of a (files x groups) incidence
+    matrix, the rows being ordered by priority. Within each group, files
+    are taken in that order while the cumulated length stays in the group
+    budget. Returns the mask of the rows taken in all of their groups.
+    """
+    order = np.lexsort((rows, cols))
+    rows, cols = rows[order], cols[order]
+    entry_lengths = lengths[rows]
+    cumsum = np.cumsum(entry_lengths)
+    starts = np.flatnonzero(np.diff(cols, prepend=-1))
+    group_sizes = np.diff(starts, append=len(cols))
+    cumsum -= np.repeat(cumsum[starts] - entry_lengths[starts], group_sizes)
+
+    fits = np.ones(n_rows, dtype=bool)
+    fits[rows[cumsum > budgets[cols]]] = False
+    return fits
+
+
+def subselect(indices, table, incidence, divisor=10, rng=None):
+    r"""
+    Selects about 1 / divisor of the audio time of the files indices, with
+    the same budget (1 / divisor of its time) for each genre. The files are
+    visited in a random order (given by rng) and greedily added while their
+    genres budgets allow it. Each pass is vectorized: the files fitting in
+    all their genres budgets are added together, and the pass is repeated
+    with the remaining budgets on the files left out.
+    """
+    if rng is None:
+        rng = np.random.default_rng(0)
+    lengths = table.file_length_sec
+    overall_time = lengths[indices].sum()
     print('Selecting from', overall_time / 60 / 60, 'hours')
 
-    genre2time = get_genre2time(fnames, fnames2jsons)
-
-    genre2budget = {}
-    for genre, time in genre2time.items():
-        genre2budget[genre] = time // divisor
-
-    time_selected = 0
-    selected_files = []
-
-    for fname in fnames:
-        if time_selected > overall_time // divisor:
+    # The overall time budget is handled as one more genre, shared by all
+    # the files
+    candidates = rng.permutation(np.sort(indices))
+    file_incidence = np.concatenate(
+        [incidence[candidates], np.ones((len(candidates), 1), dtype=bool)],
+        axis=1)
+    budgets = (lengths[candidates] @ file_incidence) // divisor
+
+    selected = []
+    while len(candidates) > 0:
+        rows, cols = np.nonzero(file_incidence)
+        # Skip right away the files too long for one of their genres
+        too_long = np.zeros(len(candidates), dtype=bool)
+        too_long[rows[lengths[candidates[rows]] > budgets[cols]]] = True
+        fits = fit_prefixes(lengths[candidates], rows, cols, budgets,
+                            len(candidates)) & ~too_long
+        if not fits.any():
             break
-
-        data = fnames2jsons[fname]
-        if 'genre' not in data['book_meta'] or data['book_meta']['genre'] is None:
-            file_genres = ['<none>']
-        else:
-            file_genres = data['book_meta']['genre']
-        length = data['file_length_sec']
-
-        fits = True
-        for file_genre in file_genres:
-            fits = fits and (
-                file_genre not in genre2budget or genre2budget[file_genre] > length)
-
-        if fits:
-            time_selected += length
-            selected_files.append(fname)
-            for file_genre in file_genres:
-                if file_genre in genre2budget:
-                    genre2budget[file_genre] -= length
-
-    overall_time = sum(
-        fnames2jsons[fname]['file_length_sec'] for fname in selected_files)
+        selected.append(candidates[fits])
+        budgets -= lengths[candidates[fits]] @ file_incidence[fits]
+        keep = ~fits & ~too_long
+        candidates, file_incidence = candidates[keep], file_incidence[keep]
+
+    selected_files = np.sort(np.concatenate(selected)) if selected \
+        else np.zeros(0, dtype=np.int64)
+    overall_time = lengths[selected_files].sum()
     print('Selected', overall_time / 60 / 60, 'hours')
 
     return selected_files
 
 
-def take_n(x, n):
-    for i, k in enumerate(x):
-        yield k
-
-        if i == n - 1:
-            break
+def nested_splits(indices, table, incidence, n_steps, divisor=10, seed=0):
+    r"""
+    Returns n_steps nested splits: indices, then each split subselected from
+    the previous one.
+    """
+    rng = np.random.default_rng(seed)
+    splits = [indices]
+    for _ in range(n_steps - 1):
+        splits.append(subselect(splits[-1], table, incidence,
+                                divisor=divisor, rng=rng))
+    return splits
 
 
 def get_args():
     parser = argparse.ArgumentParser(description='Reads a direcctory with flac/meta-data files and decides how to split them in '
         'three nested sets, roughly balancing genres')
     parser.add_argument('--librivox_processed', type=str)
+    parser.add_argument('--cache_dir', type=str, default='.cache',
+                        help='Directory where the columnar table of the '
+                        'meta-data of librivox_processed is cached. It is '
+                        'compiled again when librivox_processed changes.')
+    parser.add_argument('--ignore_cache', action='store_true')
     parser.add_argument('--sampling_steps', type=int, default=3)
     parser.add_argument('--size_divisor', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the order in which files are selected')
     parser.add_argument('--debug', action='store_true')
 
     args = parser.parse_args()
@@ -156,18 +138,22 @@ def get_args():
 if __name__ == '__main__':
     args = get_args()
 
-    fnames = list(
-        take_n(pathlib.Path(args.librivox_processed).rglob('*.json'), n=1000 if args.debug else -1))
-    fnames2jsons = get_fname2json(fnames)
+    table = cached_compile_dir(args.cache_dir, args.librivox_processed,
+                               ignore_cache=args.ignore_cache)
+    incidence = table.genre_incidence()
+    indices = np.arange(min(len(table), 1000) if args.debug else len(table))
+
+    splits = nested_splits(indices, table, incidence, args.sampling_steps,
+                           divisor=args.size_divisor, seed=args.seed)
 
-    for sampling_step in range(args.sampling_steps):
+    for sampling_step, indices in enumerate(splits):
         seconds_per_genre, files_per_genre, snr_per_genre, total_seconds, unique_books, unique_speakers, mean_snr = get_stats(
-            fnames, fnames2jsons)
+            indices, table, incidence)
 
         print('Total seconds', total_seconds, ' = ',
               total_seconds / 60 / 60, ' hours')
         print('Unique speakers', len(unique_speakers), ' unique books',
-              len(unique_books), ' files ', len(fnames))
+              len(unique_books), ' files ', len(indices))
         print('Time-weighted snr', mean_snr)
 
         with open(f'split_{sampling_step}.json', 'w') as f:
@@ -175,15 +161,15 @@ if __name__ == '__main__':
                              'files': files_per_genre[genre],
                              'mean_snr': snr_per_genre[genre]}) for (genre, seconds) in seconds_per_genre.items()]
 
-            fnames_as_str = [str(f) for f in fnames]
+            fnames_as_str = table.fnames(indices)
+            speakers = table.speakers[table.speaker[indices]].tolist()
             f.write(json.dumps({
                 'distribution': dump,
                 'files': fnames_as_str,
+                'speakers': speakers,
                 'n_speakers': len(unique_speakers),
                 'n_books': len(unique_books),
-                'n_files': len(fnames),
+                'n_files': len(indices),
                 'time_weighted_snr': mean_snr},
                 indent=1))
 
-        fnames = subselect(
-            fnames, fnames2jsons, divisor=args.size_divisor)
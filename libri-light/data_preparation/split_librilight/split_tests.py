@@ -0,0 +1,85 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import unittest
+import numpy as np
+from split import fit_prefixes, subselect, nested_splits
+from corpus_table import CorpusTable
+
+
+def make_table(lengths, file_genres, n_genres):
+    n_files = len(lengths)
+    genre_offsets = np.zeros(n_files + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in file_genres], out=genre_offsets[1:])
+    return CorpusTable(
+        fname_blob=np.zeros(0, dtype=np.uint8),
+        fname_offsets=np.zeros(n_files + 1, dtype=np.int64),
+        speakers=np.array(['0']), speaker=np.zeros(n_files, dtype=np.int32),
+        books=np.array(['0']), book=np.zeros(n_files, dtype=np.int32),
+        meta_genres=np.array(['null']),
+        meta_genre=np.zeros(n_files, dtype=np.int32),
+        genres=np.array([str(x) for x in range(n_genres)]),
+        genre_offsets=genre_offsets,
+        genre_codes=np.array([g for x in file_genres for g in x],
+                             dtype=np.int32),
+        snr=np.zeros(n_files), file_length_sec=np.array(lengths, dtype=float),
+        n_vad=np.zeros(n_files, dtype=np.int32))
+
+
+class TestSubselect(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        n_files, self.n_genres = 500, 6
+        lengths = rng.uniform(10, 1000, size=n_files)
+        file_genres = [sorted(set(rng.integers(0, self.n_genres,
+                                               size=rng.integers(1, 3))))
+                       for _ in range(n_files)]
+        self.table = make_table(lengths, file_genres, self.n_genres)
+        self.incidence = self.table.genre_incidence()
+        self.indices = np.arange(n_files)
+
+    def test_fit_prefixes(self):
+        lengths = np.array([3., 2., 4., 1.])
+        incidence = np.array([[1, 0], [1, 1], [0, 1], [1, 0]], dtype=bool)
+        rows, cols = np.nonzero(incidence)
+        fits = fit_prefixes(lengths, rows, cols, np.array([5., 5.]), 4)
+        # group 0: 3 + 2 <= 5, then 3 + 2 + 1 > 5
+        # group 1: 2 <= 5, then 2 + 4 > 5
+        self.assertEqual(fits.tolist(), [True, True, False, False])
+
+    def test_budgets(self):
+        divisor = 4
+        selected = subselect(self.indices, self.table, self.incidence,
+                             divisor=divisor)
+        lengths = self.table.file_length_sec
+
+        genre_time = lengths @ self.incidence
+        selected_genre_time = lengths[selected] @ self.incidence[selected]
+        self.assertTrue(np.all(selected_genre_time <= genre_time // divisor))
+        self.assertLessEqual(lengths[selected].sum(),
+                             lengths.sum() // divisor)
+        # the budget is mostly filled
+        self.assertGreater(lengths[selected].sum(),
+                           0.9 * lengths.sum() / divisor)
+
+    def test_order_and_seed(self):
+        rng = np.random.default_rng(3)
+        selected = subselect(self.indices, self.table, self.incidence,
+                             rng=np.random.default_rng(0))
+        shuffled = subselect(rng.permutation(self.indices), self.table,
+                             self.incidence, rng=np.random.default_rng(0))
+        self.assertEqual(selected.tolist(), shuffled.tolist())
+
+        other = subselect(self.indices, self.table, self.incidence,
+                          rng=np.random.default_rng(1))
+        self.assertNotEqual(selected.tolist(), other.tolist())
+
+    def test_nested(self):
+        splits = nested_splits(self.indices, self.table, self.incidence,
+                               n_steps=3, divisor=3)
+        self.assertEqual(len(splits), 3)
+        for large, small in zip(splits[:-1], splits[1:]):
+            self.assertTrue(set(small.tolist()) <= set(large.tolist()))
+            self.assertLess(len(small), len(large))
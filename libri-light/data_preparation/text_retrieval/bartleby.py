@@ -1,6 +1,6 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 from html.parser import HTMLParser
-import requests
+import fetch
 import time
 
 
@@ -94,8 +94,7 @@ def get_bartheleby_data(url):
 
     def loadText(locUrl):
         parser = BarthelebyParser()
-        req = requests.get(locUrl)
-        parser.feed(str(req._content))
+        parser.feed(str(fetch.get(locUrl)))
         time.sleep(1)
         if not parser.textFound:
             return None
@@ -105,8 +104,7 @@ def get_bartheleby_data(url):
 
         # Load title
         parser = BarthelebyTitleParser()
-        req = requests.get(url)
-        parser.feed(str(req._content))
+        parser.feed(str(fetch.get(url)))
 
         if not parser.titleFound:
             raise RuntimeError("No title found")
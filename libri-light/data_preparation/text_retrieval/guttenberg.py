@@ -1,5 +1,5 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
-import requests
+import fetch
 
 
 def is_guttenberg_url(url):
@@ -11,4 +11,4 @@ def is_guttenberg_url(url):
 def get_guttenberg_data(url):
     txtID = url.split('/')[-1]
     targetURL = f'http://www.gutenberg.org/cache/epub/{txtID}/pg{txtID}.txt'
-    return requests.get(targetURL)._content.decode("utf-8")
+    return fetch.get(targetURL).decode("utf-8")
@@ -1,6 +1,6 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 from html.parser import HTMLParser
-import requests
+import fetch
 
 
 class HathitrustParser(HTMLParser):
@@ -69,8 +69,7 @@ def load_whole_book(bookID):
 
     while True:
         parserChapter = HathitrustParser()
-        req = requests.get(nextUrl)
-        parserChapter.feed(req._content.decode('utf-8'))
+        parserChapter.feed(fetch.get(nextUrl).decode('utf-8'))
         if parserChapter.nextUrl is None:
             break
         nextUrl = f"https://babel.hathitrust.org{parserChapter.nextUrl}"
@@ -90,8 +89,7 @@ def load_hathitrust_book(url):
     candidatesID = None
     if url.find("catalog.hathitrust.org") >= 0:
         catalogParser = CatalogParser()
-        req = requests.get(url)
-        catalogParser.feed(req._content.decode('utf-8'))
+        catalogParser.feed(fetch.get(url).decode('utf-8'))
 
         if len(catalogParser.candidatesID) == 0:
             raise RuntimeError("Invalid url")
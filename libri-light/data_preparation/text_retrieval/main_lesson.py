@@ -1,6 +1,6 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 from html.parser import HTMLParser
-import requests
+import fetch
 
 
 def get_tag_value_in_url(url, tag):
@@ -91,20 +91,16 @@ def get_all_text_from_main_lesson(url):
     tocUrl = get_full_url(author, book, '_contents')
 
     parserToC = ToCParser()
-    req = requests.get(tocUrl)
-    parserToC.feed(str(req._content))
-
-    fullText = ""
-
-    for chapterName in parserToC.chaptersList:
+    parserToC.feed(str(fetch.get(tocUrl)))
 
+    def loadChapter(chapterName):
         txtUrl = get_full_url(author, book, chapterName)
         parserChapter = ChapterParser()
-        req = requests.get(txtUrl)
-        parserChapter.feed(str(req._content))
-        fullText += parserChapter.get_full_text()
+        parserChapter.feed(str(fetch.get(txtUrl)))
+        return parserChapter.get_full_text()
 
-    return fullText
+    # The chapters are independent pages: fetch them concurrently
+    return "".join(fetch.thread_map(loadChapter, parserToC.chaptersList))
 
 
 def is_main_lesson_url(url):
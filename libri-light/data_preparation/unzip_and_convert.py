@@ -1,8 +1,34 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
+import io
 import os
+import shutil
 import subprocess
 import argparse
 import multiprocessing
+import time
+import zipfile
+import numpy as np
+import soundfile as sf
+import torch
+import torchaudio
+
+
+VALID_FORMATS = ['.mp3', '.ogg', '.flac', '.wav']
+
+
+def _unzip_file(task):
+    full_path_in, full_path_out = task
+    if os.path.isdir(full_path_out):
+        return 0
+
+    # Extract in a temporary directory so that an interrupted extraction is
+    # never mistaken for a finished one
+    tmp_path_out = full_path_out + '.tmp'
+    shutil.rmtree(tmp_path_out, ignore_errors=True)
+    with zipfile.ZipFile(full_path_in) as archive:
+        archive.extractall(tmp_path_out)
+    os.rename(tmp_path_out, full_path_out)
+    return 1
 
 
 def unzip(args):
@@ -18,42 +44,119 @@ def unzip(args):
 
     print(f"{len(files_in)} files found")
 
-    for file_name in files_in:
-        full_path_in = os.path.join(args.path_in, file_name)
-        full_path_out = os.path.join(args.path_out,
-                                     os.path.splitext(file_name)[0])
+    tasks = [(os.path.join(args.path_in, file_name),
+              os.path.join(args.path_out, os.path.splitext(file_name)[0]))
+             for file_name in files_in]
+
+    with multiprocessing.Pool(processes=args.n_processes) as pool:
+        n_unzipped = sum(pool.imap_unordered(_unzip_file, tasks))
+    print(f"{n_unzipped} files unzipped, "
+          f"{len(files_in) - n_unzipped} already done")
+
+
+def _decode_ffmpeg(path_in_file, sample_rate):
+    r"""
+    path_in_file is either a path or a file object, whose content is then
+    fed to ffmpeg through its standard input.
+    """
+    if isinstance(path_in_file, str):
+        path_ffmpeg, stdin_data = path_in_file, None
+    else:
+        path_in_file.seek(0)
+        path_ffmpeg, stdin_data = "pipe:0", path_in_file.read()
+    out = subprocess.run(["ffmpeg", "-i", path_ffmpeg,
+                          "-ac", "1",
+                          "-ar", str(sample_rate),
+                          "-f", "f32le", "-"],
+                         input=stdin_data,
+                         stdout=subprocess.PIPE,
+                         stderr=subprocess.DEVNULL, check=True)
+    return torch.frombuffer(bytearray(out.stdout), dtype=torch.float32)
+
 
-        if not os.path.isdir(full_path_out):
-            os.mkdir(full_path_out)
+def decode_audio(path_in_file, sample_rate):
+    r"""
+    Decodes path_in_file (a path or a file object) in the current process
+    and returns a mono float32 tensor sampled at sample_rate. Falls back to
+    an ffmpeg subprocess for the files libsndfile cannot read.
+    """
+    try:
+        data, file_rate = sf.read(path_in_file, dtype='float32',
+                                  always_2d=True)
+    except sf.LibsndfileError:
+        return _decode_ffmpeg(path_in_file, sample_rate)
+    data = torch.from_numpy(data).mean(dim=1)
+    if file_rate != sample_rate:
+        data = torchaudio.functional.resample(data, file_rate, sample_rate)
+    return data
 
-        subprocess.run(["unzip", full_path_in, "-d", full_path_out])
+
+def write_audio(data, path_out_file, sample_rate):
+    r"""
+    Writes the output file through a temporary name, so that only complete
+    files exist under path_out_file.
+    """
+    audio_format = os.path.splitext(path_out_file)[1][1:].upper()
+    tmp_path = path_out_file + '.tmp'
+    # Resampling can overshoot [-1, 1]: how the out-of-range samples are
+    # converted to PCM_16 otherwise depends on the libsndfile version
+    sf.write(tmp_path, np.clip(data.numpy(), -1, 1), sample_rate,
+             format=audio_format)
+    os.replace(tmp_path, path_out_file)
 
 
 def _convert_dir(task):
     dir_name, args = task
-    valid_formats = ['.mp3', '.ogg', '.flac', '.wav']
 
     full_path_in = os.path.join(args.path_in, dir_name)
     files_list = [f for f in os.listdir(full_path_in)
-                  if os.path.splitext(f)[1] in valid_formats]
+                  if os.path.splitext(f)[1] in VALID_FORMATS]
 
     full_path_out = os.path.join(args.path_out, dir_name)
     if not os.path.isdir(full_path_out):
         os.mkdir(full_path_out)
 
+    n_converted, n_skipped, n_samples = 0, 0, 0
     for file_name in files_list:
         base_name, format = os.path.splitext(file_name)
         path_out_file = os.path.join(
             full_path_out, base_name + args.format)
+        if os.path.isfile(path_out_file):
+            n_skipped += 1
+            continue
         path_in_file = os.path.join(full_path_in, file_name)
 
-        subprocess.run(["ffmpeg", "-i", path_in_file,
-                        "-ac", "1",
-                        "-ar", str(args.sample_rate), path_out_file],
-                       stdout=subprocess.DEVNULL)
+        data = decode_audio(path_in_file, args.sample_rate)
+        write_audio(data, path_out_file, args.sample_rate)
+        n_converted += 1
+        n_samples += data.size(0)
+
+    return n_converted, n_skipped, n_samples / args.sample_rate
+
 
+def log_conversion(results):
+    r"""
+    Consumes the (n_converted, n_skipped, seconds) results of the workers
+    and regularly prints the conversion speed.
+    """
+    start_time = time.time()
+    n_converted, n_skipped, n_seconds = 0, 0, 0.
+    for index, (converted, skipped, seconds) in enumerate(results):
+        n_converted += converted
+        n_skipped += skipped
+        n_seconds += seconds
+        if index % 100 == 99:
+            elapsed = time.time() - start_time
+            print(f"{index + 1} books, {n_converted / elapsed:.1f} file/s, "
+                  f"{n_seconds / 3600:.1f} hours converted")
+    elapsed = time.time() - start_time
+    print(f"{n_converted} files converted in {elapsed:.1f}s "
+          f"({n_converted / max(elapsed, 1e-6):.1f} file/s), "
+          f"{n_seconds / 3600:.2f} hours of audio, "
+          f"{n_skipped} files already done")
 
-def convert(args, n_processes=16):
+
+def convert(args):
 
     if args.path_out is None:
         args.path_out = args.path_in
@@ -65,8 +168,65 @@ def convert(args, n_processes=16):
                if os.path.isdir(os.path.join(args.path_in, f))]
     print(f"{len(dirs_in)} books found")
 
-    pool = multiprocessing.Pool(processes=n_processes)
-    pool.map(_convert_dir, [(dir_name, args) for dir_name in dirs_in])
+    # Each worker decodes in-process: don't let torch spawn its own threads
+    torch.set_num_threads(1)
+    with multiprocessing.Pool(processes=args.n_processes) as pool:
+        log_conversion(pool.imap_unordered(
+            _convert_dir, [(dir_name, args) for dir_name in dirs_in]))
+
+
+def _convert_zip(task):
+    file_name, args = task
+
+    full_path_out = os.path.join(args.path_out,
+                                 os.path.splitext(file_name)[0])
+    if not os.path.isdir(full_path_out):
+        os.mkdir(full_path_out)
+
+    n_converted, n_skipped, n_samples = 0, 0, 0
+    with zipfile.ZipFile(os.path.join(args.path_in, file_name)) as archive:
+        for member in archive.infolist():
+            base_name, format = os.path.splitext(
+                os.path.basename(member.filename))
+            if member.is_dir() or format not in VALID_FORMATS:
+                continue
+            path_out_file = os.path.join(
+                full_path_out, base_name + args.format)
+            if os.path.isfile(path_out_file):
+                n_skipped += 1
+                continue
+
+            # Decoders need to seek: buffer the compressed member in memory
+            data = decode_audio(io.BytesIO(archive.read(member)),
+                                args.sample_rate)
+            write_audio(data, path_out_file, args.sample_rate)
+            n_converted += 1
+            n_samples += data.size(0)
+
+    return n_converted, n_skipped, n_samples / args.sample_rate
+
+
+def convert_zip(args):
+    r"""
+    Same as unzip followed by convert, but the audio files are decoded
+    directly from the .zip archives: the extracted files are never written
+    to disk.
+    """
+
+    if args.path_out is None:
+        args.path_out = args.path_in
+
+    if not os.path.isdir(args.path_out):
+        os.mkdir(args.path_out)
+
+    files_in = [f for f in os.listdir(args.path_in)
+                if os.path.splitext(f)[1] == '.zip']
+    print(f"{len(files_in)} files found")
+
+    torch.set_num_threads(1)
+    with multiprocessing.Pool(processes=args.n_processes) as pool:
+        log_conversion(pool.imap_unordered(
+            _convert_zip, [(file_name, args) for file_name in files_in]))
 
 
 if __name__ == "__main__":
@@ -79,6 +239,8 @@ if __name__ == "__main__":
                                          help='Unzip the Libri-Light dataset')
     parser_unzip.add_argument('path_in', type=str)
     parser_unzip.add_argument('-o', '--path_out', type=str, default=None)
+    parser_unzip.add_argument('-j', '--n_processes', type=int, default=16,
+                              help="Number of worker processes")
 
     parser_convert = subparsers.add_parser('convert',
                                            help="Convert the "
@@ -91,9 +253,27 @@ if __name__ == "__main__":
     parser_convert.add_argument('-j', '--n_processes', type=int, default=16,
                                 help="Number of worker processes")
 
+    parser_convert_zip = subparsers.add_parser('convert_zip',
+                                               help="Convert the zipped "
+                                               "Librilight_dataset into the "
+                                               "desired format, without "
+                                               "extracting the archives.")
+    parser_convert_zip.add_argument('path_in', type=str)
+    parser_convert_zip.add_argument('-o', '--path_out', type=str,
+                                    default=None)
+    parser_convert_zip.add_argument('-f', '--format', type=str,
+                                    default=".flac")
+    parser_convert_zip.add_argument('-s', '--sample_rate', type=int,
+                                    default=16000)
+    parser_convert_zip.add_argument('-j', '--n_processes', type=int,
+                                    default=16,
+                                    help="Number of worker processes")
+
     args = parser.parse_args()
 
     if args.command == 'unzip':
         unzip(args)
     elif args.command == 'convert':
         convert(args)
+    elif args.command == 'convert_zip':
+        convert_zip(args)
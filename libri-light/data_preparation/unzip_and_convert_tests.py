@@ -0,0 +1,47 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import soundfile as sf
+import torch
+from unzip_and_convert import write_audio
+
+
+class TestWriteAudio(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_out_of_range(self):
+        path_out = os.path.join(self.tmp_dir.name, 'out.flac')
+        data = torch.tensor([0.5, 1.5, -2.0, -0.25, 1.0], dtype=torch.float32)
+        # whatever the libsndfile version, it only gets samples in [-1, 1]
+        with mock.patch('unzip_and_convert.sf.write',
+                        wraps=sf.write) as write:
+            write_audio(data, path_out, 16000)
+        written = write.call_args[0][1]
+        self.assertEqual(written.tolist(), [0.5, 1.0, -1.0, -0.25, 1.0])
+
+        self.assertFalse(os.path.exists(path_out + '.tmp'))
+        out, sample_rate = sf.read(path_out, dtype='int16')
+        self.assertEqual(sample_rate, 16000)
+        int16 = np.iinfo(np.int16)
+        # saturated, not wrapped around
+        self.assertGreaterEqual(out[1], int16.max - 1)
+        self.assertLessEqual(out[2], int16.min + 1)
+        self.assertEqual(out[1], out[4])
+        self.assertAlmostEqual(out[0] / int16.max, 0.5, places=3)
+        self.assertAlmostEqual(out[3] / int16.max, -0.25, places=3)
+
+
+if __name__ == '__main__':
+    unittest.main()
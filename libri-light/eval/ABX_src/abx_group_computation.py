@@ -2,6 +2,7 @@
 import torch
 import math
 from .ABX_src import dtw
+from .abx_iterators import prefetch_map
 import progressbar
 
 
@@ -66,7 +67,8 @@ def get_euclidian_distance_batch(a1, a2):
 
 def get_distance_group_dtw(a1, a2, size1, size2,
                            ignore_diag=False, symmetric=False,
-                           distance_function=get_cosine_distance_batch):
+                           distance_function=get_cosine_distance_batch,
+                           n_threads=0):
 
     N1, S1, D = a1.size()
     N2, S2, D = a2.size()
@@ -77,20 +79,24 @@ def get_distance_group_dtw(a1, a2, size1, size2,
     assert(size2.size(0) == N2)
 
     distance_mat = distance_function(a1, a2).detach().cpu().numpy()
-    return dtw.dtw_batch(a1, a2, size1, size2,
-                         distance_mat,
-                         ignore_diag, symmetric)
+    return torch.from_numpy(dtw.dtw_batch(a1, a2, size1, size2,
+                                          distance_mat,
+                                          ignore_diag, symmetric,
+                                          n_threads=n_threads))
 
 
-def get_theta_group_dtw(a, b, x, sa, sb, sx, distance_function, symmetric):
+def get_theta_group_dtw(a, b, x, sa, sb, sx, distance_function, symmetric,
+                        n_threads=0):
 
     check_dtw_group_validity(a, b, x)
 
     dxb = get_distance_group_dtw(
-        x, b, sx, sb, distance_function=distance_function)
+        x, b, sx, sb, distance_function=distance_function,
+        n_threads=n_threads)
     dxa = get_distance_group_dtw(x, a, sx, sa, ignore_diag=symmetric,
                                  symmetric=symmetric,
-                                 distance_function=distance_function)
+                                 distance_function=distance_function,
+                                 n_threads=n_threads)
 
     Nx, Na = dxa.size()
     Nx, Nb = dxb.size()
@@ -112,7 +118,7 @@ def get_theta_group_dtw(a, b, x, sa, sb, sx, distance_function, symmetric):
     return sc.item()
 
 
-def loc_dtw(data, distance_function, symmetric):
+def loc_dtw(data, distance_function, symmetric, n_threads=0):
     coords, group_a, group_b, group_x = data
     group_a_data, group_a_size = group_a
     group_b_data, group_b_size = group_b
@@ -124,26 +130,51 @@ def loc_dtw(data, distance_function, symmetric):
                                 group_b_size,
                                 group_x_size,
                                 distance_function,
-                                symmetric)
+                                symmetric,
+                                n_threads=n_threads)
 
     return (coords, 1 - theta)
 
 
 def get_abx_scores_dtw_on_group(group_iterator,
                                 distance_function,
-                                symmetric):
+                                symmetric,
+                                n_workers=1):
+    r"""
+    Computes the ABX score of all the triplets of group_iterator.
+
+    The unit of work is a triplet of groups (A, B and X, the groups
+    compared by one score): with n_workers > 1, the triplets are built and
+    scored by a pool of threads. The random subsampling of each triplet
+    is seeded from the starts of its groups (see ABXIterator.get_rng), so
+    the scores don't depend on n_workers nor on the order of the triplets.
+
+    Only one level of parallelism is used: the DTWs of a triplet run on a
+    single thread when n_workers > 1, and on all the OpenMP threads only
+    when n_workers <= 1.
+    """
+    # The worker threads already use all the cores: no nested OpenMP
+    n_threads = 0 if n_workers <= 1 else 1
+
+    def score_triplet(triplet_ids):
+        # torch.no_grad only applies to the current thread
+        with torch.no_grad():
+            return loc_dtw(group_iterator.get_triplet(triplet_ids),
+                           distance_function, symmetric,
+                           n_threads=n_threads)
 
     data_list = []
     coords_list = []
     bar = progressbar.ProgressBar(maxval=len(group_iterator))
     bar.start()
 
-    with torch.no_grad():
-        for index, group in enumerate(group_iterator):
-            bar.update(index)
-            coords, abx = loc_dtw(group, distance_function, symmetric)
-            data_list.append(abx)
-            coords_list.append(coords)
+    for index, (coords, abx) in \
+            enumerate(prefetch_map(score_triplet,
+                                   group_iterator.iter_triplet_ids(),
+                                   n_workers)):
+        bar.update(index)
+        data_list.append(abx)
+        coords_list.append(coords)
     bar.finish()
 
     return torch.sparse.FloatTensor(torch.LongTensor(coords_list).t(),
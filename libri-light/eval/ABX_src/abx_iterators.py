@@ -2,7 +2,16 @@
 import torch
 import progressbar
 import math
+import os
 import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+# Number of frames normalized at once
+NORMALIZATION_BATCH = 2**16
 
 
 def normalize_with_singularity(x):
@@ -12,19 +21,136 @@ def normalize_with_singularity(x):
     cosine distance from any non-null vector.
     """
     S, H = x.size()
+    out = torch.empty((S, H + 1), dtype=x.dtype, device=x.device)
+    out[:, :H] = x
+    normalize_with_singularity_(out)
+    return out
+
+
+def normalize_with_singularity_(data):
+    r"""
+    In place version of normalize_with_singularity: data[:, :-1] holds the
+    vectors to normalize and data[:, -1] receives the extra dimension.
+    """
+    x = data[:, :-1]
+    S, H = x.size()
     norm_x = (x**2).sum(dim=1, keepdim=True)
 
     x /= torch.sqrt(norm_x)
     zero_vals = (norm_x == 0).view(S)
     x[zero_vals] = 1 / math.sqrt(H)
-    border_vect = torch.zeros((S, 1),
-                              dtype=x.dtype,
-                              device=x.device) + 1e-12
-    border_vect[zero_vals] = -2*1e12
-    return torch.cat([x, border_vect], dim=1)
+    data[:, -1] = 1e-12
+    data[zero_vals, -1] = -2*1e12
+
+
+def prefetch_map(function, values, n_workers):
+    r"""
+    Same as map(function, values), with up to 2 * n_workers calls running in
+    background threads ahead of the consumer.
+    """
+    if n_workers <= 1:
+        yield from map(function, values)
+        return
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        pending = deque()
+        for value in values:
+            pending.append(executor.submit(function, value))
+            if len(pending) >= 2 * n_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def factorize(values):
+    r"""
+    Returns (vocabulary, ids) with vocabulary[ids] == values. Ids are given
+    in order of first appearance, as in a {value: id} dict built while
+    reading values.
+    """
+    match = {}
+    ids = np.fromiter((match.setdefault(x, len(match)) for x in values),
+                      dtype=np.int64, count=len(values))
+    return np.array(list(match)), ids
 
 
-def load_item_file(path_item_file):
+def _parse_item_file(path_item_file):
+    tokens = []
+    with open(path_item_file, 'r') as file:
+        file.readline()
+        for index, line in enumerate(file):
+            row = line.split()
+            if len(row) != 7:
+                if not row:
+                    continue
+                raise ValueError(f"{path_item_file}, line {index + 2}: "
+                                 "invalid .item file, expected 7 columns, "
+                                 f"got {len(row)}")
+            tokens += row
+
+    files, file_ids = factorize(tokens[0::7])
+    phones, phone_ids = factorize(tokens[3::7])
+    contexts, context_ids = factorize(
+        [f'{prev}+{next}' for prev, next in zip(tokens[4::7], tokens[5::7])])
+    speakers, speaker_ids = factorize(tokens[6::7])
+
+    return {'file_id': file_ids,
+            'onset': np.array(tokens[1::7], dtype=np.float64),
+            'offset': np.array(tokens[2::7], dtype=np.float64),
+            'context_id': context_ids,
+            'phone_id': phone_ids,
+            'speaker_id': speaker_ids,
+            'files': files,
+            'contexts': contexts,
+            'phones': phones,
+            'speakers': speakers}
+
+
+def parse_item_file(path_item_file, use_cache=False):
+    r""" Columnar version of load_item_file. Returns a dict of arrays:
+    file_id, onset, offset, context_id, phone_id, speaker_id: one value per
+    item. The ids index the vocabularies files, contexts, phones and speakers, and
+    are the same as the ones of load_item_file.
+
+    If use_cache is True, the arrays are saved in path_item_file.npz, which
+    is used as long as the item file isn't modified.
+    """
+    path_cache = str(path_item_file) + '.npz'
+    stat = os.stat(path_item_file)
+    signature = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    if use_cache and os.path.isfile(path_cache):
+        with np.load(path_cache) as data:
+            if np.array_equal(data['signature'], signature):
+                return {key: data[key] for key in data.files
+                        if key != 'signature'}
+
+    items = _parse_item_file(path_item_file)
+    if use_cache:
+        tmp_path = path_cache + '.tmp.npz'
+        np.savez(tmp_path, signature=signature, **items)
+        os.replace(tmp_path, path_cache)
+    return items
+
+
+def group_items_by_file(items):
+    r"""
+    Returns {file ID: the onset, offset, context_id, phone_id, speaker_id
+    array of its items}, with the items in the order of the item file.
+    """
+    table = np.stack([items['onset'], items['offset'],
+                      items['context_id'], items['phone_id'],
+                      items['speaker_id']], axis=1)
+    order = np.argsort(items['file_id'], kind='stable')
+    bounds = np.cumsum(np.bincount(items['file_id'],
+                                   minlength=len(items['files'])))
+    out = {}
+    start = 0
+    for fileID, end in zip(items['files'].tolist(), bounds.tolist()):
+        out[fileID] = table[order[start:end]]
+        start = end
+    return out
+
+
+def load_item_file(path_item_file, use_cache=False):
     r""" Load a .item file indicating the triplets for the ABX score. The
     input file must have the following fomat:
     line 0 : whatever (not read)
@@ -32,81 +158,50 @@ def load_item_file(path_item_file):
     onset : begining of the triplet (in s)
     onset : end of the triplet (in s)
     """
-    with open(path_item_file, 'r') as file:
-        data = file.readlines()[1:]
-
-    data = [x.replace('\n', '') for x in data]
-
-    out = {}
-
-    phone_match = {}
-    speaker_match = {}
-    context_match = {}
-
-    for line in data:
-        items = line.split()
-        assert(len(items) == 7)
-        fileID = items[0]
-        if fileID not in out:
-            out[fileID] = []
+    items = parse_item_file(path_item_file, use_cache=use_cache)
 
-        onset, offset = float(items[1]), float(items[2])
-        context = '+'.join([items[4], items[5]])
-        phone = items[3]
-        speaker = items[6]
+    out = {fileID: [[onset, offset, int(c), int(p), int(s)]
+                    for onset, offset, c, p, s in data.tolist()]
+           for fileID, data in group_items_by_file(items).items()}
 
-        if phone not in phone_match:
-            s = len(phone_match)
-            phone_match[phone] = s
-        phone_id = phone_match[phone]
+    context_match = {x: i for i, x in enumerate(items['contexts'].tolist())}
+    phone_match = {x: i for i, x in enumerate(items['phones'].tolist())}
+    speaker_match = {x: i for i, x in enumerate(items['speakers'].tolist())}
 
-        if context not in context_match:
-            s = len(context_match)
-            context_match[context] = s
-        context_id = context_match[context]
+    return out, context_match, phone_match, speaker_match
 
-        if speaker not in speaker_match:
-            s = len(speaker_match)
-            speaker_match[speaker] = s
-        speaker_id = speaker_match[speaker]
 
-        out[fileID].append([onset, offset, context_id, phone_id, speaker_id])
+def get_features_group(in_data, index_order):
+    r"""
+    Sorts the rows of in_data by the columns index_order and groups them.
+    Returns (in_index, out_groups): in_index is the sorting permutation and
+    out_groups the nested groups of rows with the same values, one nesting
+    level per column of index_order. The leaves are (start, end) ranges of
+    in_index.
+    """
+    if len(in_data) == 0:
+        return [], []
 
-    return out, context_match, phone_match, speaker_match
+    keys = np.asarray(in_data)[:, index_order]
+    # np.lexsort sorts by its last key first, and is stable as list.sort
+    in_index = np.lexsort(keys[:, ::-1].T)
+    keys = keys[in_index]
 
+    # changed[i, k]: one of the first k + 1 columns changes at row i + 1
+    changed = np.logical_or.accumulate(keys[1:] != keys[:-1], axis=1)
+    starts = np.concatenate([[0], np.flatnonzero(changed[:, -1]) + 1])
+    ends = np.append(starts[1:], len(keys))
+    groups = list(zip(starts.tolist(), ends.tolist()))
 
-def get_features_group(in_data, index_order):
+    # Merges the groups of each level into the groups of the level above
+    for level in range(len(index_order) - 2, -1, -1):
+        splits = np.flatnonzero(changed[starts[1:] - 1, level]) + 1
+        bounds = [0] + splits.tolist() + [len(groups)]
+        groups = [groups[start:end] for start, end in
+                  zip(bounds[:-1], bounds[1:])]
+        starts = starts[bounds[:-1]]
 
-    in_index = list(range(len(in_data)))
-    in_index.sort(key=lambda x: [in_data[x][i] for i in index_order])
-    out_groups = []
-    last_values = [in_data[in_index[0]][i] for i in index_order]
-    i_s = 0
-    curr_group = [[] for i in index_order]
-    n_orders = len(index_order) - 1
-    tmp = [in_data[i] for i in in_index]
-
-    for index, item in enumerate(tmp):
-        for order_index, order in enumerate(index_order):
-            if item[order] != last_values[order_index]:
-                curr_group[-1].append((i_s, index))
-                for i in range(n_orders, order_index, -1):
-                    curr_group[i-1].append(curr_group[i])
-                    curr_group[i] = []
-                if order_index == 0:
-                    out_groups += curr_group[0]
-                    curr_group[0] = []
-                last_values = [item[i] for i in index_order]
-                i_s = index
-                break
-
-    if i_s < len(in_data):
-        curr_group[-1].append((i_s, len(in_data)))
-        for i in range(n_orders, 0, -1):
-            curr_group[i-1].append(curr_group[i])
-        out_groups += curr_group[0]
-
-    return in_index, out_groups
+    return in_index.tolist(), groups
 
 
 class ABXFeatureLoader:
@@ -116,7 +211,9 @@ class ABXFeatureLoader:
                  seqList,
                  featureMaker,
                  stepFeature,
-                 normalize):
+                 normalize,
+                 use_cache=False,
+                 n_workers=8):
         r"""
         Args:
             path_item_file (str): path to the .item files containing the ABX
@@ -130,6 +227,9 @@ class ABXFeatureLoader:
                                      given file.
             normalize (bool): if True all input features will be noramlized
                               across the channels dimension.
+            use_cache (bool): if True, the parsed item file is cached in
+                              path_item_file.npz
+            n_workers (int): number of threads calling featureMaker
 
         Note:
         You can use this dataset with pre-computed features. For example, if
@@ -137,62 +237,128 @@ class ABXFeatureLoader:
         you can just set featureMaker = torch.load.
         """
 
-        files_data, self.context_match, self.phone_match, self.speaker_match = \
-            load_item_file(path_item_file)
+        start_time = time.time()
+        items = parse_item_file(path_item_file, use_cache=use_cache)
+        files_data = group_items_by_file(items)
+        self.timings = {'item_file': time.time() - start_time}
+        self.context_match = {x: i for i, x in
+                              enumerate(items['contexts'].tolist())}
+        self.phone_match = {x: i for i, x in
+                            enumerate(items['phones'].tolist())}
+        self.speaker_match = {x: i for i, x in
+                              enumerate(items['speakers'].tolist())}
         self.seqNorm = True
         self.stepFeature = stepFeature
-        self.loadFromFileData(files_data, seqList, featureMaker, normalize)
+        self.loadFromFileData(files_data, seqList, featureMaker, normalize,
+                              n_workers=n_workers)
 
-    def loadFromFileData(self, files_data, seqList, feature_maker, normalize):
+        print("ABX loader timings: " +
+              ", ".join(f"{name} {value:.2f}s"
+                        for name, value in self.timings.items()))
+
+    def loadFromFileData(self, files_data, seqList, feature_maker, normalize,
+                         n_workers=8):
 
         # self.features[i]: index_start, size, context_id, phone_id, speaker_id
-        self.features = []
+        # stored column by column: self.features[:, self.INDEX_PHONE] is
+        # contiguous
         self.INDEX_CONTEXT = 2
         self.INDEX_PHONE = 3
         self.INDEX_SPEAKER = 4
-        data = []
 
+        if not hasattr(self, 'timings'):
+            self.timings = {}
+
+        # Only the files of the item file are loaded
+        seqList = [(fileID, file_path) for fileID, file_path in seqList
+                   if fileID in files_data]
+
+        # Frame indexes of all the phones of each file, before clipping to
+        # the size of the features. They give an upper bound of the total
+        # number of frames to load.
+        file_bounds = []
+        max_size = 0
+        for fileID, _ in seqList:
+            phone_data = np.asarray(files_data[fileID],
+                                    dtype=np.float64).reshape(-1, 5)
+            index_start = np.maximum(
+                0, np.ceil(self.stepFeature * phone_data[:, 0] - 0.5))
+            index_end = np.floor(self.stepFeature * phone_data[:, 1] - 0.5)
+            file_bounds.append((index_start.astype(np.int64),
+                                index_end.astype(np.int64),
+                                phone_data[:, 2:].astype(np.int64)))
+            max_size += int(np.maximum(index_end - index_start, 0).sum())
+
+        features_list = []
+        data = None
         totSize = 0
+        load_time = 0
+        gather_time = 0
 
         print("Building the input features...")
         bar = progressbar.ProgressBar(maxval=len(seqList))
         bar.start()
 
-        for index, vals in enumerate(seqList):
-
-            fileID, file_path = vals
+        paths = [file_path for _, file_path in seqList]
+        start_time = time.time()
+        for index, features in \
+                enumerate(prefetch_map(feature_maker, paths, n_workers)):
             bar.update(index)
-            if fileID not in files_data:
-                continue
-
-            features = feature_maker(file_path)
-            if normalize:
-                features = normalize_with_singularity(features)
+            # Time spent waiting for the feature maker
+            load_time += time.time() - start_time
+            start_time = time.time()
 
             features = features.detach().cpu()
+            n_frames, dim = features.size()
+
+            index_start, index_end, ids = file_bounds[index]
+            index_end = np.minimum(index_end, n_frames)
+            keep = (index_start < n_frames) & (index_end > index_start)
+            index_start, index_end = index_start[keep], index_end[keep]
+
+            loc_sizes = index_end - index_start
+            loc_offsets = np.cumsum(loc_sizes) - loc_sizes
+            n_loc = int(loc_sizes.sum())
+
+            # Gather all the frames of the file in a single copy. The
+            # normalization adds one dimension, it is done afterwards on the
+            # kept frames only.
+            frames = np.repeat(index_start - loc_offsets, loc_sizes) \
+                + np.arange(n_loc)
+            if data is None:
+                data = torch.empty((max_size, dim + int(normalize)),
+                                   dtype=features.dtype)
+            data[totSize:(totSize + n_loc), :dim] = \
+                features[torch.from_numpy(frames)]
+
+            loc_features = np.empty((len(loc_sizes), 5), dtype=np.int64)
+            loc_features[:, 0] = totSize + loc_offsets
+            loc_features[:, 1] = loc_sizes
+            loc_features[:, 2:] = ids[keep]
+            features_list.append(loc_features)
+            totSize += n_loc
+            gather_time += time.time() - start_time
+            start_time = time.time()
 
-            phone_data = files_data[fileID]
-
-            for phone_start, phone_end, context_id, phone_id, speaker_id in phone_data:
+        bar.finish()
+        print("...done")
 
-                index_start = max(
-                    0, int(math.ceil(self.stepFeature * phone_start - 0.5)))
-                index_end = min(features.size(0),
-                                int(math.floor(self.stepFeature * phone_end - 0.5)))
+        if totSize == 0:
+            raise RuntimeError("No feature matches the item file")
 
-                if index_start >= features.size(0) or index_end <= index_start:
-                    continue
+        self.timings['features'] = load_time
+        self.timings['gather'] = gather_time
 
-                loc_size = index_end - index_start
-                self.features.append([totSize, loc_size, context_id,
-                                      phone_id, speaker_id])
-                data.append(features[index_start:index_end])
-                totSize += loc_size
+        start_time = time.time()
+        data = data[:totSize]
+        if normalize:
+            for start in range(0, totSize, NORMALIZATION_BATCH):
+                normalize_with_singularity_(
+                    data[start:(start + NORMALIZATION_BATCH)])
+        self.timings['normalization'] = time.time() - start_time
 
-        bar.finish()
-        print("...done")
-
-        self.data = torch.cat(data, dim=0)
+        self.features = np.asfortranarray(np.concatenate(features_list))
+        self.data = data
         self.feature_dim = self.data.size(1)
 
     def get_data_device(self):
@@ -206,14 +372,15 @@ class ABXFeatureLoader:
 
     def get_max_group_size(self, i_group, i_sub_group):
         id_start, id_end = self.group_index[i_group][i_sub_group]
-        return max([self.features[i][1] for i in range(id_start, id_end)])
+        return int(self.features[id_start:id_end, 1].max())
 
     def get_ids(self, index):
-        context_id, phone_id, speaker_id = self.features[index][2:]
+        context_id, phone_id, speaker_id = self.features[index, 2:].tolist()
         return context_id, phone_id, speaker_id
 
     def __getitem__(self, index):
-        i_data, out_size, context_id, phone_id, speaker_id = self.features[index]
+        i_data, out_size, context_id, phone_id, speaker_id = \
+            self.features[index].tolist()
         return self.data[i_data:(i_data + out_size)], out_size, (context_id, phone_id, speaker_id)
 
     def __len__(self):
@@ -234,23 +401,28 @@ class ABXFeatureLoader:
     def get_n_sub_group(self, index_sub_group):
         return len(self.group_index[index_sub_group])
 
-    def get_iterator(self, mode, max_size_group):
+    def get_iterator(self, mode, max_size_group, seed=0):
         if mode == 'within':
-            return ABXWithinGroupIterator(self, max_size_group)
+            return ABXWithinGroupIterator(self, max_size_group, seed=seed)
         if mode == 'across':
-            return ABXAcrossGroupIterator(self, max_size_group)
+            return ABXAcrossGroupIterator(self, max_size_group, seed=seed)
         raise ValueError(f"Invalid mode: {mode}")
 
 
 class ABXIterator:
     r"""
     Base class building ABX's triplets.
+
+    The random subsampling of each triplet only depends on seed and on the
+    triplet: the triplets can be built in any order, or in parallel with
+    get_triplet, and stay the same.
     """
 
-    def __init__(self, abxDataset, max_size_group):
+    def __init__(self, abxDataset, max_size_group, seed=0):
         self.max_size_group = max_size_group
         self.dataset = abxDataset
         self.len = 0
+        self.seed = seed
 
         self.index_csp, self.groups_csp = \
             get_features_group(abxDataset.features,
@@ -258,12 +430,19 @@ class ABXIterator:
                                 abxDataset.INDEX_SPEAKER,
                                 abxDataset.INDEX_PHONE])
 
-    def get_group(self, i_start, i_end):
+    def get_rng(self, *group_starts):
+        r"""
+        Random generator of the triplet made of the groups starting at
+        group_starts.
+        """
+        return random.Random('-'.join(map(str, (self.seed,) + group_starts)))
+
+    def get_group(self, i_start, i_end, rng=random):
         data = []
         max_size = 0
         to_take = list(range(i_start, i_end))
         if i_end - i_start > self.max_size_group:
-            to_take = random.sample(to_take, k=self.max_size_group)
+            to_take = rng.sample(to_take, k=self.max_size_group)
         for i in to_take:
             loc_data, loc_size, loc_id = self.dataset[self.index_csp[i]]
             max_size = max(loc_size, max_size)
@@ -286,6 +465,23 @@ class ABXIterator:
     def __len__(self):
         return self.len
 
+    def __iter__(self):
+        for triplet_ids in self.iter_triplet_ids():
+            yield self.get_triplet(triplet_ids)
+
+    def iter_triplet_ids(self):
+        r"""
+        Yields the group bounds of each triplet, to give to get_triplet.
+        """
+        pass
+
+    def get_triplet(self, triplet_ids):
+        r"""
+        Returns the coordinates and the data of the triplet: coords, (data_a,
+        size_a), (data_b, size_b), (data_x, size_x).
+        """
+        pass
+
     def get_board_size(self):
         r"""
         Get the output dimension of the triplet's space.
@@ -298,10 +494,10 @@ class ABXWithinGroupIterator(ABXIterator):
     Iterator giving the triplets for the ABX within score.
     """
 
-    def __init__(self, abxDataset, max_size_group):
+    def __init__(self, abxDataset, max_size_group, seed=0):
 
         super(ABXWithinGroupIterator, self).__init__(abxDataset,
-                                                     max_size_group)
+                                                     max_size_group, seed)
         self.symmetric = True
 
         for context_group in self.groups_csp:
@@ -311,7 +507,7 @@ class ABXWithinGroupIterator(ABXIterator):
                         if i_end - i_start > 1:
                             self.len += (len(speaker_group) - 1)
 
-    def __iter__(self):
+    def iter_triplet_ids(self):
         for i_c, context_group in enumerate(self.groups_csp):
             for i_s, speaker_group in enumerate(context_group):
                 n_phones = len(speaker_group)
@@ -328,14 +524,17 @@ class ABXWithinGroupIterator(ABXIterator):
                             continue
 
                         i_start_b, i_end_b = self.groups_csp[i_c][i_s][i_b]
-                        data_b, size_b, id_b = self.get_group(i_start_b,
-                                                              i_end_b)
-                        data_a, size_a, id_a = self.get_group(i_start_a,
-                                                              i_end_a)
+                        yield (i_start_a, i_end_a), (i_start_b, i_end_b)
+
+    def get_triplet(self, triplet_ids):
+        (i_start_a, i_end_a), (i_start_b, i_end_b) = triplet_ids
+        rng = self.get_rng(i_start_a, i_start_b)
+        data_b, size_b, id_b = self.get_group(i_start_b, i_end_b, rng)
+        data_a, size_a, id_a = self.get_group(i_start_a, i_end_a, rng)
 
-                        out_coords = id_a[2], id_a[1], id_b[1], id_a[0]
-                        yield out_coords, (data_a, size_a), (data_b, size_b), \
-                            (data_a, size_a)
+        out_coords = id_a[2], id_a[1], id_b[1], id_a[0]
+        return out_coords, (data_a, size_a), (data_b, size_b), \
+            (data_a, size_a)
 
     def get_board_size(self):
 
@@ -350,10 +549,10 @@ class ABXAcrossGroupIterator(ABXIterator):
     Iterator giving the triplets for the ABX across score.
     """
 
-    def __init__(self, abxDataset, max_size_group):
+    def __init__(self, abxDataset, max_size_group, seed=0):
 
         super(ABXAcrossGroupIterator, self).__init__(abxDataset,
-                                                     max_size_group)
+                                                     max_size_group, seed)
         self.symmetric = False
         self.get_speakers_from_cp = {}
         self.max_x = 5
@@ -385,19 +584,22 @@ class ABXAcrossGroupIterator(ABXIterator):
 
     def get_abx_triplet(self, i_a, i_b, i_x):
         i_start_a, i_end_a = i_a
-        data_a, size_a, id_a = self.get_group(i_start_a, i_end_a)
-
         i_start_b, i_end_b = i_b
-        data_b, size_b, id_b = self.get_group(i_start_b, i_end_b)
-
         i_start_x, i_end_x = i_x
-        data_x, size_x, id_x = self.get_group(i_start_x, i_end_x)
+        rng = self.get_rng(i_start_a, i_start_b, i_start_x)
+
+        data_a, size_a, id_a = self.get_group(i_start_a, i_end_a, rng)
+        data_b, size_b, id_b = self.get_group(i_start_b, i_end_b, rng)
+        data_x, size_x, id_x = self.get_group(i_start_x, i_end_x, rng)
 
         out_coords = id_a[2], id_a[1], id_b[1], id_a[0], id_x[2]
         return out_coords, (data_a, size_a), (data_b, size_b), \
             (data_x, size_x)
 
-    def __iter__(self):
+    def get_triplet(self, triplet_ids):
+        return self.get_abx_triplet(*triplet_ids)
+
+    def iter_triplet_ids(self):
         for i_c, context_group in enumerate(self.groups_csp):
             for i_s, speaker_group in enumerate(context_group):
                 n_phones = len(speaker_group)
@@ -408,7 +610,8 @@ class ABXAcrossGroupIterator(ABXIterator):
                     i_start_a, i_end_a = self.groups_csp[i_c][i_s][i_a]
                     ref = self.get_other_speakers_in_group(i_start_a)
                     if len(ref) > self.max_x:
-                        speakers_a = random.sample(ref, k=self.max_x)
+                        speakers_a = self.get_rng(i_start_a).sample(
+                            ref, k=self.max_x)
                     else:
                         speakers_a = ref
 
@@ -419,7 +622,7 @@ class ABXAcrossGroupIterator(ABXIterator):
                                 continue
 
                             i_start_b, i_end_b = self.groups_csp[i_c][i_s][i_b]
-                            yield self.get_abx_triplet((i_start_a, i_end_a), (i_start_b, i_end_b), (i_start_x, i_end_x))
+                            yield (i_start_a, i_end_a), (i_start_b, i_end_b), (i_start_x, i_end_x)
 
     def get_board_size(self):
 
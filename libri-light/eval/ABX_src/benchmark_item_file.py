@@ -0,0 +1,83 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
+import argparse
+import os
+import time
+from .abx_iterators import load_item_file, parse_item_file
+
+
+def load_item_file_by_line(path_item_file):
+    r"""
+    Line by line parser of .item files, which load_item_file replaced.
+    """
+    with open(path_item_file, 'r') as file:
+        data = file.readlines()[1:]
+
+    data = [x.replace('\n', '') for x in data]
+
+    out = {}
+
+    phone_match = {}
+    speaker_match = {}
+    context_match = {}
+
+    for line in data:
+        items = line.split()
+        assert(len(items) == 7)
+        fileID = items[0]
+        if fileID not in out:
+            out[fileID] = []
+
+        onset, offset = float(items[1]), float(items[2])
+        context = '+'.join([items[4], items[5]])
+        phone = items[3]
+        speaker = items[6]
+
+        if phone not in phone_match:
+            s = len(phone_match)
+            phone_match[phone] = s
+        phone_id = phone_match[phone]
+
+        if context not in context_match:
+            s = len(context_match)
+            context_match[context] = s
+        context_id = context_match[context]
+
+        if speaker not in speaker_match:
+            s = len(speaker_match)
+            speaker_match[speaker] = s
+        speaker_id = speaker_match[speaker]
+
+        out[fileID].append([onset, offset, context_id, phone_id, speaker_id])
+
+    return out, context_match, phone_match, speaker_match
+
+
+def timeit(name, function, *args, **kwargs):
+    start_time = time.time()
+    out = function(*args, **kwargs)
+    print(f"{name}: {time.time() - start_time:.3f}s")
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compares the .item file parsers")
+    parser.add_argument('path_item_file', type=str)
+    args = parser.parse_args()
+
+    path_cache = args.path_item_file + '.npz'
+    if os.path.isfile(path_cache):
+        os.remove(path_cache)
+
+    reference = timeit("line by line", load_item_file_by_line,
+                       args.path_item_file)
+    timeit("columnar", parse_item_file, args.path_item_file)
+    timeit("columnar, writing the cache", parse_item_file,
+           args.path_item_file, use_cache=True)
+    timeit("columnar, from the cache", parse_item_file,
+           args.path_item_file, use_cache=True)
+    out = timeit("load_item_file", load_item_file, args.path_item_file,
+                 use_cache=True)
+
+    assert out == reference
+    print("Same output and id mappings")
@@ -3,40 +3,74 @@ import torch
 import numpy as np
 cimport numpy as np
 cimport cython
-from cpython cimport bool
+from cython.parallel cimport prange, threadid
+cimport openmp
 ctypedef np.float32_t CTYPE_t # cost type
 ctypedef np.intp_t IND_t # array index type
 CTYPE = np.float32 # cost type
 
 
 
-def dtw_batch(x,y, sx, sy, dist_mat, ignore_diag=False, symetric=False):
+def dtw_batch(x,y, sx, sy, dist_mat, ignore_diag=False, symetric=False,
+              n_threads=0):
+    r"""
+    Normalized DTW costs between all the sequences of x and y, given their
+    sizes sx, sy and the Nx x Ny x Sx x Sy distances between their frames.
+    Returns a Nx x Ny numpy array, with zeros on the diagonal if
+    ignore_diag. If symetric, only the upper triangle is computed.
+    The pairs are computed without the GIL by n_threads OpenMP threads
+    (0: OpenMP's default).
+    """
+    cdef CTYPE_t[:, :, :, ::1] c_dist = np.ascontiguousarray(dist_mat,
+                                                             dtype=CTYPE)
+    cdef IND_t[::1] c_sx = np.ascontiguousarray(torch.as_tensor(sx).cpu(),
+                                                dtype=np.intp)
+    cdef IND_t[::1] c_sy = np.ascontiguousarray(torch.as_tensor(sy).cpu(),
+                                                dtype=np.intp)
+    cdef IND_t Nx = c_dist.shape[0]
+    cdef IND_t Ny = c_dist.shape[1]
+    cdef int c_threads = n_threads
+    if c_threads <= 0:
+        c_threads = openmp.omp_get_max_threads()
 
-    Nx = dist_mat.shape[0]
-    Ny = dist_mat.shape[1]
-
-    out = torch.zeros((Nx,  Ny))
+    out = np.zeros((Nx, Ny), dtype=CTYPE)
+    # One cost matrix per thread, reused for all its pairs
+    cdef CTYPE_t[:, :, ::1] cost = np.empty((c_threads, c_dist.shape[2],
+                                             c_dist.shape[3]), dtype=CTYPE)
+    cdef CTYPE_t[:, ::1] c_out = out
+    cdef bint c_ignore_diag = ignore_diag
+    cdef bint c_symetric = symetric
+    with nogil:
+        _dtw_batch(c_dist, c_sx, c_sy, c_out, cost, c_ignore_diag, c_symetric,
+                   c_threads)
+    return out
 
-    for i in range(Nx):
-        start_index = i if symetric else 0
-        i_sx = sx[i]
-        for j in range(start_index, Ny):
 
-            j_sy = sy[j]
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _dtw_batch(CTYPE_t[:, :, :, ::1] dist_mat,
+                     IND_t[::1] sx, IND_t[::1] sy,
+                     CTYPE_t[:, ::1] out, CTYPE_t[:, :, ::1] cost,
+                     bint ignore_diag, bint symetric,
+                     int n_threads) noexcept nogil:
+    cdef IND_t Nx = dist_mat.shape[0]
+    cdef IND_t Ny = dist_mat.shape[1]
+    cdef IND_t i, j
+    for i in prange(Nx, num_threads=n_threads, schedule='dynamic'):
+        for j in range(i if symetric else 0, Ny):
             if ignore_diag and i == j:
                 continue
-            distance = _dtw(i_sx, j_sy, dist_mat[i,j,:i_sx,:j_sy],True)
-            out[i][j] = distance
+            out[i, j] = _dtw(sx[i], sy[j], dist_mat[i, j],
+                             cost[threadid()], True)
             if symetric and i != j:
-                out[j][i] = out[i][j]
+                out[j, i] = out[i, j]
 
-    return out
 
-
-
-cpdef _dtw(IND_t N, IND_t M, CTYPE_t[:,:] dist_array, bool normalized):
-    cdef IND_t i, j
-    cdef CTYPE_t[:,:] cost = np.empty((N, M), dtype=CTYPE)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef CTYPE_t _dtw(IND_t N, IND_t M, CTYPE_t[:, ::1] dist_array,
+                  CTYPE_t[:, ::1] cost, bint normalized) noexcept nogil:
+    cdef IND_t i, j, path_len
     cdef CTYPE_t final_cost, c_diag, c_left, c_up
     # initialization
     cost[0,0] = dist_array[0,0]
@@ -70,5 +104,5 @@ cpdef _dtw(IND_t N, IND_t M, CTYPE_t[:,:] dist_array, bool normalized):
             path_len += j
         if j == 0:
             path_len += i
-        final_cost /= path_len
+        final_cost = <CTYPE_t>(<double>final_cost / path_len)
     return final_cost
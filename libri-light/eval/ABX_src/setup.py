@@ -1,9 +1,16 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
 from distutils.core import setup
+from distutils.extension import Extension
 from Cython.Build import cythonize
 import numpy
 
+# dtw_batch computes the DTW of several pairs in parallel with OpenMP
+extensions = [Extension("*", ["dtw.pyx"],
+                        include_dirs=[numpy.get_include()],
+                        extra_compile_args=["-O3", "-fopenmp"],
+                        extra_link_args=["-fopenmp"])]
+
 setup(
     include_dirs=[numpy.get_include()],
-    ext_modules=cythonize("dtw.pyx")
+    ext_modules=cythonize(extensions)
 )
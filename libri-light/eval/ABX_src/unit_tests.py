@@ -6,6 +6,9 @@ from . import abx_group_computation
 from . import abx_iterators
 import numpy as np
 import math
+import os
+import shutil
+import tempfile
 
 
 class TestDistancesDTW(unittest.TestCase):
@@ -179,6 +182,41 @@ class testItemLoader(unittest.TestCase):
                                    [0.5925, 0.8725, 3, 1, 0]]}
         eq_(expected_output, out)
 
+    def testMalformedItemFile(self):
+        path_tmp = tempfile.mkdtemp()
+        path_item_file = os.path.join(path_tmp, "dummy.item")
+        # 14 tokens in total, but a 6 columns line then a 8 columns line
+        with open(path_item_file, 'w') as file:
+            file.write("#file onset offset #phone prev-phone next-phone "
+                       "speaker\n"
+                       "2107 0.3225 0.5225 n ae d\n"
+                       "2107 0.4225 0.5925 d n l 2222 8193\n")
+        with self.assertRaisesRegex(ValueError, "line 2"):
+            abx_iterators.parse_item_file(path_item_file)
+        shutil.rmtree(path_tmp)
+
+    def testParseItemFileCache(self):
+        path_tmp = tempfile.mkdtemp()
+        path_item_file = os.path.join(path_tmp, "dummy.item")
+        shutil.copyfile("test_data/dummy_item_file.item", path_item_file)
+
+        items = abx_iterators.parse_item_file(path_item_file, use_cache=True)
+        ok_(os.path.isfile(path_item_file + '.npz'))
+        cached = abx_iterators.parse_item_file(path_item_file, use_cache=True)
+        eq_(set(items), set(cached))
+        for key in items:
+            ok_(np.array_equal(items[key], cached[key]))
+        eq_(items['files'][items['file_id']].tolist()[:2], ['2107', '2107'])
+
+        # The cache is not used anymore once the item file changes
+        with open(path_item_file, 'a') as file:
+            file.write("6 0.1 0.2 n s l 9\n")
+        updated = abx_iterators.parse_item_file(path_item_file,
+                                                use_cache=True)
+        eq_(len(updated['onset']), len(items['onset']) + 1)
+        eq_(updated['speakers'][-1], '9')
+        shutil.rmtree(path_tmp)
+
 
 class testABXFeatureLoader(unittest.TestCase):
 
@@ -216,6 +254,30 @@ class testABXFeatureLoader(unittest.TestCase):
         eq_(coords, (1, 1, 1))
         eq_(data.tolist(), [[5]])
 
+    def testParallelNormalizedLoader(self):
+        seqList = [('2107', 'test_data/2107.npy'),
+                   ('42', 'test_data/42.npy'),
+                   ('23', 'test_data/23.npy'),
+                   ('407', 'test_data/407.npy'),
+                   ('missing', 'test_data/missing.npy')]
+
+        def feature_maker(path_file):
+            data = testABXFeatureLoader.dummy_feature_maker(path_file)
+            return torch.cat([data, data ** 2 - 4], dim=1).float()
+
+        datasets = [abx_iterators.ABXFeatureLoader("test_data/dummy_item_file.item",
+                                                   seqList, feature_maker,
+                                                   self.stepFeature, True,
+                                                   n_workers=n_workers)
+                    for n_workers in [1, 4]]
+        eq_(datasets[0].feature_dim, 3)
+        ok_(torch.equal(datasets[0].data, datasets[1].data))
+        ok_(np.array_equal(datasets[0].features, datasets[1].features))
+
+        data = datasets[0].data
+        ok_(torch.allclose((data[:, :2] ** 2).sum(dim=1), torch.ones(16)))
+        ok_(torch.equal(data[:, 2], torch.full((16,), 1e-12)))
+
     def testWithinIterator(self):
         seqList = [('2107', 'test_data/2107.npy'),
                    ('42', 'test_data/42.npy')]
@@ -243,3 +305,43 @@ class testABXFeatureLoader(unittest.TestCase):
 
         eq_(next(it, False), False)
         eq_(iterator.get_board_size(), (2, 3, 3, 4))
+
+    def testParallelScores(self):
+        # 3 speakers saying 3 phones, 4 times each, in the same context
+        generator = torch.Generator().manual_seed(0)
+        features = {str(i): torch.randn(120, 2, generator=generator)
+                    for i in range(3)}
+        path_tmp = tempfile.mkdtemp()
+        path_item_file = os.path.join(path_tmp, "dummy.item")
+        with open(path_item_file, 'w') as file:
+            file.write("#file onset offset #phone prev-phone next-phone "
+                       "speaker\n")
+            for i in range(36):
+                file.write(f"{i % 3} {i * 0.3} {i * 0.3 + 0.2} p{i % 4} "
+                           f"a b s{i % 3}\n")
+        dataset = abx_iterators.ABXFeatureLoader(path_item_file,
+                                                 [(x, x) for x in features],
+                                                 features.get,
+                                                 self.stepFeature,
+                                                 True)
+        shutil.rmtree(path_tmp)
+        distance = abx_group_computation.get_cosine_distance_batch
+
+        for mode in ['within', 'across']:
+            # Groups of 3 items are subsampled to 2
+            iterator = dataset.get_iterator(mode, 2, seed=3)
+            iterator.max_x = 1
+            triplet_ids = list(iterator.iter_triplet_ids())
+            ok_(len(triplet_ids) > 1)
+            # The subsampling doesn't depend on the order of the triplets
+            for ids, triplet in zip(triplet_ids, iterator):
+                for x, y in zip(triplet[1:],
+                                iterator.get_triplet(ids)[1:]):
+                    ok_(torch.equal(x[0], y[0]))
+
+            scores = [abx_group_computation.get_abx_scores_dtw_on_group(
+                iterator, distance, iterator.symmetric, n_workers=n_workers)
+                for n_workers in [1, 3]]
+            ok_(torch.equal(scores[0].coalesce().values(),
+                            scores[1].coalesce().values()))
+            ok_(not torch.isnan(scores[0].coalesce().values()).any())
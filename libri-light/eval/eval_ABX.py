@@ -44,11 +44,16 @@ def ABX(feature_function,
         modes,
         cuda=False,
         max_x_across=5,
-        max_size_group=30):
+        max_size_group=30,
+        item_cache=False,
+        n_workers=8,
+        seed=0):
 
     # ABX dataset
     ABXDataset = abx_it.ABXFeatureLoader(path_item_file, seq_list,
-                                         feature_function, step_feature, True)
+                                         feature_function, step_feature, True,
+                                         use_cache=item_cache,
+                                         n_workers=n_workers)
 
     if cuda:
         ABXDataset.cuda()
@@ -62,10 +67,12 @@ def ABX(feature_function,
     # ABX within
     if 'within' in modes:
         print("Computing ABX within speakers...")
-        ABXIterator = ABXDataset.get_iterator('within', max_size_group)
+        ABXIterator = ABXDataset.get_iterator('within', max_size_group,
+                                              seed=seed)
         group_confusion = abx_g.get_abx_scores_dtw_on_group(ABXIterator,
                                                             distance_function,
-                                                            ABXIterator.symmetric)
+                                                            ABXIterator.symmetric,
+                                                            n_workers=n_workers)
         n_data = group_confusion._values().size(0)
         index_ = torch.sparse.LongTensor(group_confusion._indices(),
                                          torch.ones((n_data),
@@ -88,11 +95,13 @@ def ABX(feature_function,
     # ABX across
     if 'across' in modes:
         print("Computing ABX across speakers...")
-        ABXIterator = ABXDataset.get_iterator('across', max_size_group)
+        ABXIterator = ABXDataset.get_iterator('across', max_size_group,
+                                              seed=seed)
         ABXIterator.max_x = max_x_across
         group_confusion = abx_g.get_abx_scores_dtw_on_group(ABXIterator,
                                                             distance_function,
-                                                            ABXIterator.symmetric)
+                                                            ABXIterator.symmetric,
+                                                            n_workers=n_workers)
         n_data = group_confusion._values().size(0)
         index_ = torch.sparse.LongTensor(group_confusion._indices(),
                                          torch.ones((n_data),
@@ -150,6 +159,16 @@ def parse_args(argv):
                              "less precise.")
     parser.add_argument("--out", type=str, default=None,
                         help="Path where the results should be saved")
+    parser.add_argument("--item_cache", action='store_true',
+                        help="Save the parsed item file next to it "
+                        "(path_item_file.npz) and reuse it in the next runs")
+    parser.add_argument("--n_workers", type=int, default=8,
+                        help="Number of threads computing the features and "
+                        "the ABX scores, each one scoring a triplet of "
+                        "groups at a time. With 1, the DTWs are computed "
+                        "in parallel with OpenMP instead")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the random subsampling of the groups")
 
     # multi-gpu / multi-node
     return parser.parse_args(argv)
@@ -187,7 +206,10 @@ def main(argv):
                  step_feature, modes,
                  cuda=args.cuda,
                  max_x_across=args.max_x_across,
-                 max_size_group=args.max_size_group)
+                 max_size_group=args.max_size_group,
+                 item_cache=args.item_cache,
+                 n_workers=args.n_workers,
+                 seed=args.seed)
 
     out_dir = Path(args.path_checkpoint).parent if args.out is None \
         else Path(args.out)